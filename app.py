@@ -1,16 +1,63 @@
-from flask import Flask, render_template_string, request, url_for, send_from_directory
+from flask import Flask, render_template_string, request, url_for, send_from_directory, jsonify, g, abort
 import os
 import json
-from similarities import get_similarities
-from PIL import Image
-import base64
-from io import BytesIO
+import hmac
+import random
+import uuid
+import time
+import shutil
+import threading
+import numpy as np
+from similarities import score_image, score_regions, use_encoder, set_encoder, get_encoder, get_text_features
+from encoders import load_encoder
+from embedding_index import EmbeddingIndex
+from calibration import calibrate, decode_features, feature_names
+from export import export_catalog, thresholds_version
+from trends import TrendCounts
+from facets import FacetIndex
+from clusters import save_snapshot
+from ingest import IngestQueue, list_images, start_watcher
+from images import load_look, load_thumbnail, load_model_image, thumbnail_variants
+import metrics
+from metrics import timed, span
+from profiling import RequestProfile
+from PIL import features as pil_features
 
 app = Flask(__name__)
 
 # Configuration
 IMAGE_FOLDER = "static/images"  # Change this to your local image directory
 os.makedirs(IMAGE_FOLDER, exist_ok=True)
+INGEST_WORKERS = 2  # Number of images classified in parallel in the background
+WATCH_INTERVAL = 2.0  # Seconds between polls of IMAGE_FOLDER for new looks
+INGEST_RETRY_INTERVAL = 600.0  # Seconds before an image that failed is tried again, unless its file changes
+INGEST_KEEP_JOBS = 100  # Finished ingestion jobs listed by /ingest
+SERVER_TIMING = False  # Send Server-Timing headers on every response, not only with ?server_timing=1
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')  # Secret sent in the X-Admin-Token header for admin-only flags and endpoints; unset disables them
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))  # Fraction of page requests profiled automatically
+PROFILE_MODE = os.environ.get('PROFILE_MODE', 'sample')  # 'sample' for stack sampling, 'cprofile' for cProfile
+PROFILE_FOLDER = "profiles"  # Where traces are written
+ENCODER_BACKEND = os.environ.get('ENCODER_BACKEND', 'fashion-clip')  # 'fashion-clip', 'fashion-clip-int8' or 'stub' (offline)
+REGION_MODE = False  # Score upper/lower/full crops so attributes stay with their own garment
+PROMPT_TEMPLATES = []  # e.g. similarities.RUNWAY_TEMPLATES to ensemble prompts; empty encodes bare labels
+FEATURE_THRESHOLD = 20  # Similarity cutoff for every label until thresholds are calibrated
+MIN_CALIBRATION_LOOKS = 50  # Fewer looks than this give unreliable per-label thresholds
+EXPORT_FOLDER = "exports"  # Parquet/Arrow trend exports for analysts
+EMBEDDINGS_FOLDER = "embeddings"  # Memory-mappable embedding snapshots read by clusters.py
+PAGE_SIZE = 24  # Looks per grid page; later pages load as the user scrolls
+SEARCH_RESULTS = 12  # Nearest runway looks returned for an uploaded photo
+MAX_SEARCH_RESULTS = 100  # Largest k a /search request may ask for
+MAX_UPLOAD_MB = 20  # Largest photo accepted by /search
+THUMBNAIL_FOLDER = "thumbnails"  # Encoded thumbnails, one folder per look
+COMPACT_THUMBNAIL_SIZES = (400,)  # Sizes also encoded as AVIF/WebP; every other size is JPEG only
+
+# Thumbnail encodings, most compact first: (name, mimetype, PIL save options).
+# JPEG is always kept as the fallback for clients that accept nothing better.
+THUMBNAIL_FORMATS = [
+    ('avif', 'image/avif', {'format': 'AVIF', 'quality': 55, 'speed': 10}),
+    ('webp', 'image/webp', {'format': 'WEBP', 'quality': 80, 'method': 2}),
+    ('jpeg', 'image/jpeg', {'format': 'JPEG', 'quality': 85, 'optimize': True, 'progressive': True})
+]
 
 # Labels from base.py
 labels1 = {
@@ -37,6 +84,19 @@ for comp in ['dress', 'skirt']:
     for l in ['mini', 'maxi', 'midi']:
         labels.append(f'{l} {comp}')
 
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
+
+# Thumbnail formats this Pillow build can encode
+thumbnail_formats = [fmt for fmt in THUMBNAIL_FORMATS if fmt[0] == 'jpeg' or pil_features.check(fmt[0])]
+
+# Crop region each component is scored on in region mode
+component_regions = {'dress': 'full', 'skirt': 'lower', 'top': 'upper', 'shirt': 'upper', 'jacket': 'upper'}
+label_regions = [component_regions.get(label.split()[-1], 'full') for label in labels]
+
+# Feature reported by each label, and the cutoff applied to every label's score until calibrated
+label_features = feature_names(labels)
+default_thresholds = np.full(len(labels), FEATURE_THRESHOLD, dtype=np.float32)
+
 # Create flat list of all features from labels1 for the dropdown
 all_features_flat = []
 for category, items in labels1.items():
@@ -48,77 +108,252 @@ seasons = ['Spring Summer','Fall Winter']
 years = ['2021','2022','2023','2024','2025']
 shows = ['Paris','New York','Milan','London']
 
-# Cache for image features
+# Folder name of every show, e.g. "YSL Fall Winter 2024 Paris", to its filter values
+show_folders = {
+    f"{designer} {season} {year} {show}": {'designer': designer, 'season': season, 'year': year, 'show': show}
+    for designer in designers for season in seasons for year in years for show in shows
+}
+show_order = {name: i for i, name in enumerate(show_folders)}  # Scan order, for paging by look id
+
+# Embedding backend; every cache below is keyed by its model id first
+use_encoder(ENCODER_BACKEND)
+
+# Cache for image features, by model id then image path
 image_features_cache = {}
 
-def get_image_features(image_path):
-    """Extract features from an image or get from cache"""
-    if image_path in image_features_cache:
-        return image_features_cache[image_path]
+# Raw label scores, by model id then image path, kept for threshold calibration
+image_scores_cache = {}
+
+# Calibrated label thresholds by model id
+calibrated_thresholds = {}
+
+# Processed looks by image path; only complete records of the active model are ever inserted
+catalog = {}
+catalog_lock = threading.RLock()  # Held while publishing and while switching models
+
+# Image embeddings of processed looks by model id, per crop region
+embedding_indexes = {}
+
+def model_cache(cache, model_id=None):
+    """A model's part of a cache keyed by model id, the active model's by default"""
+    return cache.setdefault(model_id or get_encoder().model_id, {})
+
+def model_thresholds(model_id=None):
+    """Calibrated label thresholds of a model, the active model's by default"""
+    return calibrated_thresholds.get(model_id or get_encoder().model_id, default_thresholds)
+
+def get_embedding_index(model_id=None):
+    """Embedding index of a model, the active model's by default"""
+    model_id = model_id or get_encoder().model_id
+    index = embedding_indexes.get(model_id)
+    if index is None:
+        # setdefault is atomic, so concurrent workers all get the same new index
+        index = embedding_indexes.setdefault(model_id, EmbeddingIndex(model_id))
+    return index
+
+# Feature counts per designer, season, year and show, kept in step with the catalog
+trend_counts = TrendCounts(dict.fromkeys(label_features), designers, seasons, years, shows)
+
+# Facet bitmaps of the catalog's looks for filter option counts, kept in step with it too
+facet_index = FacetIndex({
+    'designer': designers,
+    'season': seasons,
+    'year': years,
+    'show': shows,
+    'feature': all_features_flat
+})
+
+@timed('get_image_features')
+def get_image_features(image_path, image=None, encoder=None):
+    """Extract features from an image or get from cache.
+
+    Every step uses the one encoder passed in, the active one by default.
+    Errors propagate, so the ingestion job counts the look as failed instead
+    of publishing it without features.
+    """
+    encoder = encoder or get_encoder()
+    features_cache = model_cache(image_features_cache, encoder.model_id)
+    metrics.cache_lookup('image_features', image_path in features_cache)
+    if image_path in features_cache:
+        return features_cache[image_path]
     
-    try:
-        similarities = get_similarities(image_path, labels)
-        features = []
-        
-        for i, feature in enumerate(labels):
-            if similarities[i].item() > 20: 
-                features_list = feature.split()
-                if len(features_list) > 1:
-                    features.append(' '.join(features_list[:-1]))
-                else:
-                    features.append(feature)
-        features=set(features)
-        features=list(features)
-        image_features_cache[image_path] = features
-        return features
-    except Exception as e:
-        print(f"Error processing {image_path}: {e}")
-        return []
+    image = image if image is not None else image_path
+    if REGION_MODE:
+        similarities, embeddings = score_regions(image, labels, label_regions, PROMPT_TEMPLATES, encoder)
+    else:
+        similarities, embeddings = score_image(image, labels, PROMPT_TEMPLATES, encoder)
+    get_embedding_index(encoder.model_id).add(image_path, embeddings)
+    scores = similarities.numpy()
+    model_cache(image_scores_cache, encoder.model_id)[image_path] = scores
+    features = decode_features(scores, model_thresholds(encoder.model_id), label_features)
+    features_cache[image_path] = features
+    return features
+
+def get_look_id(image_path):
+    """URL-safe id of a look, its path below IMAGE_FOLDER"""
+    return os.path.relpath(image_path, IMAGE_FOLDER).replace(os.sep, '/')
 
-def get_image_base64(image_path):
-    """Convert image to base64 for embedding in HTML"""
+def thumbnail_path(look_id, size, name):
+    """File of a look's thumbnail at one size and format, below THUMBNAIL_FOLDER"""
+    return os.path.join(*look_id.split('/'), f"{size}.{name}")
+
+@timed('get_thumbnails')
+def get_thumbnails(image_path, thumbnail=None):
+    """Write thumbnails of every srcset size to THUMBNAIL_FOLDER as {size: (width, height, {format: bytes written})}"""
     try:
-        img = Image.open(image_path)
-        # Resize for thumbnail - reduced size to fit better in cards
-        img.thumbnail((400, 400))
-        buffered = BytesIO()
-        img.save(buffered, format="JPEG", quality=95)
-        return base64.b64encode(buffered.getvalue()).decode()
+        img = thumbnail if thumbnail is not None else load_thumbnail(image_path)
+        look_id = get_look_id(image_path)
+        thumbnails = {}
+        for size, variant in thumbnail_variants(img).items():
+            encoded = {}
+            for name, _, options in thumbnail_formats:
+                if name != 'jpeg' and size not in COMPACT_THUMBNAIL_SIZES:
+                    continue
+                path = os.path.join(THUMBNAIL_FOLDER, thumbnail_path(look_id, size, name))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Replaced in one step so a request never reads a half-written file
+                variant.save(path + '.tmp', **options)
+                os.replace(path + '.tmp', path)
+                encoded[name] = os.path.getsize(path)
+            thumbnails[size] = (variant.width, variant.height, encoded)
+        return thumbnails
     except Exception as e:
         print(f"Error converting image {image_path}: {e}")
-        return ""
+        return {}
+
+def process_look(image_path):
+    """Classify an image and build its thumbnails, run on an ingestion worker"""
+    encoder = get_encoder()
+    model_image, thumbnail = load_look(image_path)
+    metadata = show_folders.get(os.path.basename(os.path.dirname(image_path)), {})
+    return dict(
+        metadata,
+        model_id=encoder.model_id,
+        features=get_image_features(image_path, model_image, encoder),
+        thumbnails=get_thumbnails(image_path, thumbnail)
+    )
 
+def update_look_indexes(image_path, old_record, new_record):
+    """Move a look's contribution to the trend counts and facets from its old to its new record"""
+    if old_record is not None and 'designer' in old_record:
+        trend_counts.remove(old_record, old_record['features'])
+    if 'designer' in new_record:
+        trend_counts.add(new_record, new_record['features'])
+        facet_index.add(image_path, new_record)
+    else:
+        facet_index.remove(image_path)
+
+def publish_look(image_path, record):
+    """Make a processed look visible to page requests.
+
+    Records of a model that is no longer active are dropped, so the catalog
+    never mixes models; the look is queued again on the next scan.
+    """
+    with catalog_lock:
+        if record['model_id'] != get_encoder().model_id:
+            return False
+        update_look_indexes(image_path, catalog.get(image_path), record)
+        catalog[image_path] = record
+    return True
+
+ingest_queue = IngestQueue(process_look, publish_look, max_workers=INGEST_WORKERS,
+                           retry_after=INGEST_RETRY_INTERVAL, keep_jobs=INGEST_KEEP_JOBS)
+metrics.register_gauge('runway_ingest_queue_depth', ingest_queue.depth, 'Images waiting for or in background processing')
+metrics.register_gauge('runway_catalog_looks', lambda: len(catalog), 'Processed looks visible to page requests')
+
+def forget_look(image_path):
+    """Remove a look whose image was deleted or moved from the catalog, its indexes and caches"""
+    with catalog_lock:
+        record = catalog.pop(image_path, None)
+        if record is not None:
+            update_look_indexes(image_path, record, {})
+        for cache in (image_features_cache, image_scores_cache):
+            for model_entries in cache.values():
+                model_entries.pop(image_path, None)
+        for embedding_index in embedding_indexes.values():
+            embedding_index.remove(image_path)
+    shutil.rmtree(os.path.join(THUMBNAIL_FOLDER, *get_look_id(image_path).split('/')), ignore_errors=True)
+
+def queue_new_images(name, image_paths):
+    """Queue images of known show folders that are not in the catalog yet and have not just failed"""
+    # Looks outside show_folders have no filter values and could never be shown
+    if name not in show_folders:
+        return
+    new_paths = [p for p in image_paths if p not in catalog and not ingest_queue.has_failed(p)]
+    if new_paths:
+        ingest_queue.submit(new_paths, name=name)
+
+@timed('scan_image_directory')
 def scan_image_directory():
-    """Scan the image directory and extract features"""
+    """Scan the image directory and list looks, queuing unseen images and dropping deleted ones"""
     all_images = []
+    cataloged = 0
     
     for designer in designers:
         for season in seasons:
             for year in years:
                 for show in shows:
-                    dir_path = os.path.join(IMAGE_FOLDER, f"{designer} {season} {year} {show}")
+                    dir_name = f"{designer} {season} {year} {show}"
+                    dir_path = os.path.join(IMAGE_FOLDER, dir_name)
                     
                     if not os.path.exists(dir_path):
                         continue
-                        
-                    for filename in os.listdir(dir_path):
-                        if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                            image_path = os.path.join(dir_path, filename)
-                            features = get_image_features(image_path)
-                            
-                            all_images.append({
-                                'path': image_path,
-                                'filename': filename,
-                                'designer': designer,
-                                'season': season,
-                                'year': year,
-                                'show': show,
-                                'features': features,
-                                'base64': get_image_base64(image_path)
-                            })
+                    
+                    image_paths = list_images(dir_path)
+                    queue_new_images(dir_name, image_paths)
+                    
+                    for image_path in image_paths:
+                        record = catalog.get(image_path)
+                        metrics.cache_lookup('catalog', record is not None)
+                        cataloged += record is not None
+                        all_images.append({
+                            'path': image_path,
+                            'id': get_look_id(image_path),
+                            'filename': os.path.basename(image_path),
+                            'designer': designer,
+                            'season': season,
+                            'year': year,
+                            'show': show,
+                            'pending': record is None,
+                            'features': record['features'] if record else [],
+                            'thumbnails': record['thumbnails'] if record else {}
+                        })
+    
+    # More catalog records than listed files means some images were deleted or moved
+    if len(catalog) > cataloged:
+        listed = {image['path'] for image in all_images}
+        for image_path in list(catalog):
+            if image_path not in listed and not os.path.exists(image_path):
+                forget_look(image_path)
     
     return all_images
 
+# Grid cards, rendered for the first page and for every page fetched on scroll
+CARDS_TEMPLATE = '''
+{% for image in images %}
+<div class="image-card">
+    <div class="image-container">
+        {% if image.src %}
+        <img src="{{ image.src }}" srcset="{{ image.srcset }}" sizes="(max-width: 768px) 45vw, 240px"
+             width="{{ image.width }}" height="{{ image.height }}" loading="lazy" decoding="async" alt="{{ image.filename }}">
+        {% elif image.pending %}
+        <div class="pending-placeholder">Pending</div>
+        {% else %}
+        <div class="pending-placeholder">Preview unavailable</div>
+        {% endif %}
+    </div>
+    <div class="image-features">
+        {% if image.pending %}
+        <span class="feature-badge">pending</span>
+        {% endif %}
+        {% for feature in image.features %}
+        <span class="feature-badge">{{ feature }}</span>
+        {% endfor %}
+    </div>
+</div>
+{% endfor %}
+'''
+
 # HTML template with inline CSS
 HTML_TEMPLATE = '''
 <!DOCTYPE html>
@@ -483,6 +718,7 @@ HTML_TEMPLATE = '''
         
         .image-container img {
             max-width: 100%;
+            height: auto;
             max-height: 280px;
             object-fit: contain;
             transition: transform 0.3s ease;
@@ -553,6 +789,67 @@ HTML_TEMPLATE = '''
             font-weight: 500;
             border: 1px solid #e9ecef;
         }
+
+        .trends-panel {
+            display: grid;
+            grid-template-columns: repeat(auto-fit, minmax(280px, 1fr));
+            gap: 20px;
+            margin-bottom: 30px;
+        }
+
+        .trend-list {
+            padding: 15px 20px;
+            border: 1px solid #e9ecef;
+            border-radius: 12px;
+            display: flex;
+            flex-wrap: wrap;
+            gap: 6px;
+            align-items: center;
+        }
+
+        .trend-list h4 {
+            width: 100%;
+            font-size: 0.8rem;
+            font-weight: 500;
+            text-transform: uppercase;
+            letter-spacing: 1px;
+        }
+
+        .trend-badge {
+            padding: 2px 8px;
+            border-radius: 10px;
+            font-size: 0.75rem;
+            font-weight: 500;
+            border: 1px solid #e9ecef;
+        }
+
+        .trend-badge.rising {
+            background: #000000;
+            color: white;
+        }
+
+        .trend-badge.fading {
+            background: #f8f9fa;
+            color: #6c757d;
+        }
+
+        .grid-sentinel {
+            grid-column: 1 / -1;
+            height: 1px;
+        }
+
+        .pending-placeholder {
+            width: 100%;
+            height: 280px;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            background: #f8f9fa;
+            color: #6c757d;
+            font-size: 0.8rem;
+            text-transform: uppercase;
+            letter-spacing: 1px;
+        }
     </style>
 </head>
 <body>
@@ -641,25 +938,34 @@ HTML_TEMPLATE = '''
             </div>
             
             <div class="action-buttons">
-                <button class="btn btn-primary" onclick="applyFilters()">Apply Filters</button>
+                <button id="apply-filters" class="btn btn-primary" onclick="applyFilters()">Apply Filters</button>
                 <button class="btn btn-secondary" onclick="clearFilters()">Clear All</button>
             </div>
         </div>
         
+        {% if trend_delta and (trend_delta.rising or trend_delta.fading) %}
+        <div class="trends-panel">
+            <div class="trend-list">
+                <h4>Rising vs {{ trend_base_year }}</h4>
+                {% for trend in trend_delta.rising %}
+                <span class="trend-badge rising" title="{{ '%.0f'|format(trend.base_share * 100) }}% &rarr; {{ '%.0f'|format(trend.target_share * 100) }}% of looks">{{ trend.feature }} &times;{{ '%.1f'|format(trend.lift) }}</span>
+                {% endfor %}
+            </div>
+            <div class="trend-list">
+                <h4>Fading vs {{ trend_base_year }}</h4>
+                {% for trend in trend_delta.fading %}
+                <span class="trend-badge fading" title="{{ '%.0f'|format(trend.base_share * 100) }}% &rarr; {{ '%.0f'|format(trend.target_share * 100) }}% of looks">{{ trend.feature }} &times;{{ '%.1f'|format(trend.lift) }}</span>
+                {% endfor %}
+            </div>
+        </div>
+        {% endif %}
+        
         <div class="image-grid">
             {% if filtered_images %}
-                {% for image in filtered_images %}
-                <div class="image-card">
-                    <div class="image-container">
-                        <img src="data:image/jpeg;base64,{{ image.base64 }}" alt="{{ image.filename }}">
-                    </div>
-                    <div class="image-features">
-                        {% for feature in image.features %}
-                        <span class="feature-badge">{{ feature }}</span>
-                        {% endfor %}
-                    </div>
-                </div>
-                {% endfor %}
+                {{ cards_html|safe }}
+                {% if next_cursor %}
+                <div id="grid-sentinel" class="grid-sentinel" data-after="{{ next_cursor }}"></div>
+                {% endif %}
             {% else %}
                 <div class="no-results">
                     <h3>No Collections Found</h3>
@@ -689,6 +995,9 @@ HTML_TEMPLATE = '''
         let highlightedIndex = -1;
         let dropdownVisible = false;
         
+        // Matching look counts per feature for the current selection, from /facets
+        let featureCounts = {};
+        
         function addDesigner() {
             const select = document.getElementById('designer-select');
             const designer = select.value;
@@ -717,6 +1026,8 @@ HTML_TEMPLATE = '''
                 tag.onclick = () => removeDesigner(designer);
                 container.appendChild(tag);
             });
+            
+            refreshFacets();
         }
         
         function addSeason() {
@@ -747,6 +1058,8 @@ HTML_TEMPLATE = '''
                 tag.onclick = () => removeSeason(season);
                 container.appendChild(tag);
             });
+            
+            refreshFacets();
         }
         
         function addYear() {
@@ -777,6 +1090,8 @@ HTML_TEMPLATE = '''
                 tag.onclick = () => removeYear(year);
                 container.appendChild(tag);
             });
+            
+            refreshFacets();
         }
         
         function addShow() {
@@ -807,6 +1122,8 @@ HTML_TEMPLATE = '''
                 tag.onclick = () => removeShow(show);
                 container.appendChild(tag);
             });
+            
+            refreshFacets();
         }
         
         function filterFeatures() {
@@ -841,7 +1158,8 @@ HTML_TEMPLATE = '''
                     items.forEach(item => {
                         const option = document.createElement('div');
                         option.className = 'feature-option';
-                        option.textContent = item;
+                        option.dataset.feature = item;
+                        option.textContent = featureLabel(item);
                         option.onclick = function(e) {
                             e.preventDefault();
                             e.stopPropagation();
@@ -855,7 +1173,8 @@ HTML_TEMPLATE = '''
                 filteredFeatures.forEach((feature, index) => {
                     const option = document.createElement('div');
                     option.className = 'feature-option';
-                    option.textContent = feature;
+                    option.dataset.feature = feature;
+                    option.textContent = featureLabel(feature);
                     option.onclick = function(e) {
                         e.preventDefault();
                         e.stopPropagation();
@@ -907,8 +1226,7 @@ HTML_TEMPLATE = '''
             } else if (event.key === 'Enter') {
                 event.preventDefault();
                 if (highlightedIndex >= 0 && options[highlightedIndex]) {
-                    const featureText = options[highlightedIndex].textContent;
-                    selectFeature(featureText);
+                    selectFeature(options[highlightedIndex].dataset.feature);
                 }
             } else if (event.key === 'Escape') {
                 hideDropdown();
@@ -951,17 +1269,50 @@ HTML_TEMPLATE = '''
                 tag.onclick = () => removeFeature(feature);
                 container.appendChild(tag);
             });
+            
+            refreshFacets();
+        }
+        
+        function selectionQuery() {
+            let query = '';
+            if (selectedDesigners.length) query += selectedDesigners.map(d => `designer=${encodeURIComponent(d)}`).join('&') + '&';
+            if (selectedSeasons.length) query += selectedSeasons.map(s => `season=${encodeURIComponent(s)}`).join('&') + '&';
+            if (selectedYears.length) query += selectedYears.map(y => `year=${encodeURIComponent(y)}`).join('&') + '&';
+            if (selectedShows.length) query += selectedShows.map(s => `show=${encodeURIComponent(s)}`).join('&') + '&';
+            if (selectedFeatures.length) query += selectedFeatures.map(f => `feature=${encodeURIComponent(f)}`).join('&');
+            return query;
         }
         
         function applyFilters() {
-            let url = '/?';
-            if (selectedDesigners.length) url += selectedDesigners.map(d => `designer=${encodeURIComponent(d)}`).join('&') + '&';
-            if (selectedSeasons.length) url += selectedSeasons.map(s => `season=${encodeURIComponent(s)}`).join('&') + '&';
-            if (selectedYears.length) url += selectedYears.map(y => `year=${encodeURIComponent(y)}`).join('&') + '&';
-            if (selectedShows.length) url += selectedShows.map(s => `show=${encodeURIComponent(s)}`).join('&') + '&';
-            if (selectedFeatures.length) url += selectedFeatures.map(f => `feature=${encodeURIComponent(f)}`).join('&');
-            
-            window.location.href = url;
+            window.location.href = '/?' + selectionQuery();
+        }
+        
+        function featureLabel(feature) {
+            return feature in featureCounts ? `${feature} (${featureCounts[feature]})` : feature;
+        }
+        
+        function updateSelectCounts(selectId, counts) {
+            document.querySelectorAll(`#${selectId} option`).forEach(option => {
+                if (option.value && option.value in counts) {
+                    option.textContent = `${option.value} (${counts[option.value]})`;
+                    option.disabled = counts[option.value] === 0;
+                }
+            });
+        }
+        
+        function refreshFacets() {
+            fetch('/facets?' + selectionQuery())
+                .then(response => response.json())
+                .then(facets => {
+                    updateSelectCounts('designer-select', facets.designer);
+                    updateSelectCounts('season-select', facets.season);
+                    updateSelectCounts('year-select', facets.year);
+                    updateSelectCounts('show-select', facets.show);
+                    featureCounts = facets.feature;
+                    updateFeaturesDropdown();
+                    document.getElementById('apply-filters').textContent = `Apply Filters (${facets.total})`;
+                })
+                .catch(() => {});
         }
         
         function clearFilters() {
@@ -970,25 +1321,88 @@ HTML_TEMPLATE = '''
         
         // Initialize features dropdown
         updateFeaturesDropdown();
+        refreshFacets();
+        
+        // Infinite scroll: fetch the next page of cards as the end of the grid approaches
+        const sentinel = document.getElementById('grid-sentinel');
+        if (sentinel) {
+            let loading = false;
+            const observer = new IntersectionObserver(entries => {
+                if (!entries[0].isIntersecting || loading) return;
+                loading = true;
+                const params = new URLSearchParams(window.location.search);
+                params.set('after', sentinel.dataset.after);
+                fetch('/looks?' + params.toString())
+                    .then(response => response.json())
+                    .then(page => {
+                        sentinel.insertAdjacentHTML('beforebegin', page.html);
+                        if (page.after) {
+                            sentinel.dataset.after = page.after;
+                            // Re-observing reports the sentinel again if it is still on screen
+                            observer.unobserve(sentinel);
+                            observer.observe(sentinel);
+                        } else {
+                            observer.disconnect();
+                            sentinel.remove();
+                        }
+                    })
+                    .finally(() => { loading = false; });
+            }, { rootMargin: '800px' });
+            observer.observe(sentinel);
+        }
     </script>
 </body>
 </html>
 '''
 
-@app.route('/')
-def index():
-    # Get filter parameters
-    selected_designer = request.args.getlist('designer')
-    selected_season = request.args.getlist('season')
-    selected_year = request.args.getlist('year')
-    selected_show = request.args.getlist('show')
-    selected_features = request.args.getlist('feature')
+def recalibrate(method='percentile', **params):
+    """Derive per-label thresholds from every stored score and re-decode all features"""
+    with catalog_lock:
+        model_id = get_encoder().model_id
+        items = list(model_cache(image_scores_cache, model_id).items())
+        if len(items) < MIN_CALIBRATION_LOOKS:
+            raise ValueError(f"Need at least {MIN_CALIBRATION_LOOKS} processed looks to calibrate, have {len(items)}")
+        
+        paths = [path for path, _ in items]
+        scores = np.stack([scores for _, scores in items])
+        thresholds = calibrate(scores, method, **params)
+        calibrated_thresholds[model_id] = thresholds
+        
+        features_cache = model_cache(image_features_cache, model_id)
+        for image_path, features in zip(paths, decode_features(scores, thresholds, label_features)):
+            features_cache[image_path] = features
+            record = catalog.get(image_path)
+            if record is not None:
+                publish_look(image_path, dict(record, features=features))
     
-    # Scan image directory
-    all_images = scan_image_directory()
+    return thresholds
+
+def switch_encoder(name):
+    """Serve looks from another encoder backend, reusing whatever its caches already hold.
+
+    Looks the new model has not processed yet leave the catalog and are
+    queued again as pending on the next scan. Looks still being processed
+    by the old model are dropped when they finish.
+    """
+    # Weights load before taking the lock, so publishing and page scans never wait on them
+    encoder = load_encoder(name)
+    with catalog_lock:
+        model_id = set_encoder(encoder).model_id
+        features_cache = model_cache(image_features_cache, model_id)
+        for image_path, record in list(catalog.items()):
+            if image_path in features_cache:
+                publish_look(image_path, dict(record, model_id=model_id, features=features_cache[image_path]))
+            else:
+                update_look_indexes(image_path, record, {})
+                del catalog[image_path]
     
-    # Apply filters
-    filtered_images = all_images
+    # Looks that failed with the old model may work with the new one
+    ingest_queue.forget_failures()
+    return model_id
+
+def filter_images(images, selected_designer, selected_season, selected_year, selected_show, selected_features):
+    """Keep looks matching every selected filter"""
+    filtered_images = images
     
     if selected_designer:
         filtered_images = [img for img in filtered_images if img['designer'] in selected_designer]
@@ -1003,23 +1417,390 @@ def index():
         filtered_images = [img for img in filtered_images if img['show'] in selected_show]
     
     if selected_features:
+        # Pending looks have no features yet, so they only show up unfiltered
         filtered_images = [img for img in filtered_images if all(feature in img['features'] for feature in selected_features)]
     
+    return filtered_images
+
+def is_admin(token):
+    """Whether a token matches ADMIN_TOKEN.
+
+    Callers read it from the X-Admin-Token header, never the query string,
+    so it stays out of access logs.
+    """
+    return bool(ADMIN_TOKEN) and bool(token) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+def look_order(look_id):
+    """Sort key of a look id in scan order: its show folder, then its filename"""
+    folder, _, filename = look_id.rpartition('/')
+    if folder not in show_order:
+        raise ValueError(f"Unknown look {look_id!r}")
+    return show_order[folder], filename
+
+def get_page(images, after=None):
+    """One page of looks following the look id `after`, and the cursor of the next page or None on the last.
+
+    Paging by the last look shown rather than by offset keeps infinite scroll
+    from repeating or skipping cards as pending looks enter or leave the
+    filtered results.
+    """
+    start = 0
+    if after is not None:
+        key = look_order(after)
+        start = next((i for i, image in enumerate(images) if look_order(image['id']) > key), len(images))
+    page = images[start:start + PAGE_SIZE]
+    next_cursor = page[-1]['id'] if start + PAGE_SIZE < len(images) else None
+    return page, next_cursor
+
+def render_cards(images):
+    """Grid card markup, with srcset URLs for each look's thumbnail sizes"""
+    cards = []
+    for image in images:
+        card = dict(image)
+        thumbnails = image['thumbnails']
+        if thumbnails:
+            default_size = 400 if 400 in thumbnails else max(thumbnails)
+            card['width'], card['height'], _ = thumbnails[default_size]
+            card['src'] = url_for('thumbnail', size=default_size, look_id=image['id'])
+            # Small sources give several sizes the same width; offer each width once
+            widths = {}
+            for size, (width, _, _) in sorted(thumbnails.items()):
+                widths.setdefault(width, size)
+            card['srcset'] = ', '.join(
+                f"{url_for('thumbnail', size=size, look_id=image['id'])} {width}w" for width, size in widths.items()
+            )
+        cards.append(card)
+    return render_template_string(CARDS_TEMPLATE, images=cards)
+
+@app.before_request
+def start_request_timing():
+    metrics.begin_request()
+
+@app.before_request
+def start_profile():
+    if request.endpoint != 'index':
+        return
+    g.profile_requested = bool(request.args.get('profile')) and is_admin(request.headers.get('X-Admin-Token', ''))
+    if g.profile_requested or random.random() < PROFILE_SAMPLE_RATE:
+        g.profile = RequestProfile(mode=PROFILE_MODE)
+
+def write_profile():
+    """Stop the request's profiler, if any, and return the path of its trace"""
+    profile = g.pop('profile', None)
+    if profile is not None:
+        return profile.finish(PROFILE_FOLDER, f"{request.endpoint}-{uuid.uuid4().hex[:8]}")
+
+@app.after_request
+def finish_profile(response):
+    path = write_profile()
+    if path and g.get('profile_requested'):
+        response.headers['X-Profile-Path'] = path
+    return response
+
+@app.teardown_request
+def stop_profile(exc):
+    # after_request is skipped when the view raises, so stop the profiler here
+    write_profile()
+
+@app.after_request
+def add_server_timing(response):
+    spans = metrics.end_request()
+    if spans and (SERVER_TIMING or request.args.get('server_timing')):
+        response.headers['Server-Timing'] = metrics.server_timing(spans)
+    return response
+
+@app.route('/')
+def index():
+    # Get filter parameters
+    selected_designer = request.args.getlist('designer')
+    selected_season = request.args.getlist('season')
+    selected_year = request.args.getlist('year')
+    selected_show = request.args.getlist('show')
+    selected_features = request.args.getlist('feature')
+    
+    # Scan image directory
+    all_images = scan_image_directory()
+    
+    # Apply filters
+    with span('filter'):
+        filtered_images = filter_images(all_images, selected_designer, selected_season, selected_year, selected_show, selected_features)
+        cards, next_cursor = get_page(filtered_images)
+    
+    # Rising and fading features against the previous year of the same selection
+    trend_delta = None
+    trend_base_year = None
+    if len(selected_year) == 1 and selected_year[0] in years and years.index(selected_year[0]) > 0:
+        trend_base_year = years[years.index(selected_year[0]) - 1]
+        target = {'designer': selected_designer, 'season': selected_season, 'year': selected_year, 'show': selected_show}
+        with span('trends'):
+            trend_delta = trend_counts.compare(dict(target, year=[trend_base_year]), target, limit=5)
+    
     # Render template
-    return render_template_string(
-        HTML_TEMPLATE,
-        designers=designers,
-        seasons=seasons,
-        years=years,
-        shows=shows,
-        labels1=labels1,
-        filtered_images=filtered_images,
-        selected_designer=selected_designer,
-        selected_season=selected_season,
-        selected_year=selected_year,
-        selected_show=selected_show,
-        selected_features=selected_features
-    )
+    with span('render'):
+        return render_template_string(
+            HTML_TEMPLATE,
+            designers=designers,
+            seasons=seasons,
+            years=years,
+            shows=shows,
+            labels1=labels1,
+            filtered_images=filtered_images,
+            cards_html=render_cards(cards),
+            next_cursor=next_cursor,
+            selected_designer=selected_designer,
+            selected_season=selected_season,
+            selected_year=selected_year,
+            selected_show=selected_show,
+            selected_features=selected_features,
+            trend_delta=trend_delta,
+            trend_base_year=trend_base_year
+        )
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Stage timings, cache hit ratios and queue depths for Prometheus"""
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+@app.route('/calibrate', methods=['POST'])
+def calibrate_endpoint():
+    """Recompute per-label thresholds over the catalog (admin only)"""
+    if not is_admin(request.headers.get('X-Admin-Token', '')):
+        return jsonify({'error': 'forbidden'}), 403
+    
+    method = request.args.get('method', 'percentile')
+    start = time.perf_counter()
+    try:
+        params = {name: float(request.args[name]) for name in ('q', 'z') if name in request.args}
+        thresholds = recalibrate(method, **params)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'method': method,
+        'looks': len(model_cache(image_scores_cache)),
+        'seconds': time.perf_counter() - start,
+        'thresholds': dict(zip(labels, thresholds.tolist()))
+    })
+
+@app.route('/export', methods=['POST'])
+def export_endpoint():
+    """Append newly processed looks to the trend export (admin only).
+
+    Every model, format and threshold version gets its own folder, e.g.
+    exports/fashion-clip/parquet/thresholds-1a2b3c4d5e6f, so recalibrating
+    starts a new series instead of mixing features from both.
+    """
+    if not is_admin(request.headers.get('X-Admin-Token', '')):
+        return jsonify({'error': 'forbidden'}), 403
+    
+    fmt = request.args.get('format', 'parquet')
+    with catalog_lock:
+        model_id = get_encoder().model_id
+        thresholds = model_thresholds(model_id)
+        looks = [dict(record, path=path, filename=os.path.basename(path))
+                 for path, record in catalog.items() if 'designer' in record]
+    root = os.path.join(EXPORT_FOLDER, model_id, fmt, f"thresholds-{thresholds_version(thresholds)}")
+    try:
+        summary = export_catalog(looks, model_cache(image_scores_cache, model_id), labels, thresholds, root, fmt)
+    except (ValueError, RuntimeError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(summary)
+
+def trend_selection(prefix):
+    """{dimension: [values]} slice from query args such as a_season=Fall Winter"""
+    return {dim: request.args.getlist(prefix + dim) for dim in ('designer', 'season', 'year', 'show')}
+
+@app.route('/trends')
+def trends_endpoint():
+    """Rising and fading features from slice a_* to slice b_*"""
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        return jsonify({'error': 'limit must be a whole number of at least 1'}), 400
+    with span('trends'):
+        return jsonify(trend_counts.compare(trend_selection('a_'), trend_selection('b_'), limit=limit))
+
+@app.route('/facets')
+def facets_endpoint():
+    """Matching processed-look counts per filter option for the current selection"""
+    with span('facets'):
+        return jsonify(facet_index.counts({
+            'designer': request.args.getlist('designer'),
+            'season': request.args.getlist('season'),
+            'year': request.args.getlist('year'),
+            'show': request.args.getlist('show'),
+            'feature': request.args.getlist('feature')
+        }))
+
+@app.route('/looks')
+def looks_page():
+    """The page of grid cards after look id `after`, for infinite scroll"""
+    after = request.args.get('after')
+    if after is not None:
+        try:
+            look_order(after)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    all_images = scan_image_directory()
+    with span('filter'):
+        filtered_images = filter_images(
+            all_images,
+            request.args.getlist('designer'),
+            request.args.getlist('season'),
+            request.args.getlist('year'),
+            request.args.getlist('show'),
+            request.args.getlist('feature')
+        )
+        cards, next_cursor = get_page(filtered_images, after)
+    with span('render'):
+        return jsonify({'html': render_cards(cards), 'after': next_cursor})
+
+def negotiate_thumbnail_format(encoded):
+    """Most compact encoded format the client lists explicitly in Accept, else JPEG"""
+    # Wildcards are ignored: browsers send */* even when they cannot decode AVIF
+    accepted = {value for value, quality in request.accept_mimetypes if quality > 0}
+    for name, mimetype, _ in thumbnail_formats:
+        if name in encoded and (mimetype in accepted or name == 'jpeg'):
+            return name, mimetype
+    return 'jpeg', 'image/jpeg'
+
+@app.route('/thumbnails/<int:size>/<path:look_id>')
+def thumbnail(size, look_id):
+    """Thumbnail of a processed look in the best format the client accepts"""
+    record = catalog.get(os.path.join(IMAGE_FOLDER, *look_id.split('/')))
+    if record is None or size not in record['thumbnails']:
+        abort(404)
+    _, _, encoded = record['thumbnails'][size]
+    name, mimetype = negotiate_thumbnail_format(encoded)
+    metrics.inc('runway_thumbnails_served_total', (('format', name),))
+    response = send_from_directory(os.path.abspath(THUMBNAIL_FOLDER), thumbnail_path(look_id, size, name), mimetype=mimetype)
+    response.headers['Cache-Control'] = 'public, max-age=604800'
+    response.headers['Vary'] = 'Accept'
+    return response
+
+@app.route('/thumbnails/report')
+def thumbnail_report():
+    """Total and average thumbnail bytes per format and size, relative to JPEG"""
+    totals = {}
+    counts = {}
+    for record in list(catalog.values()):
+        for size, (_, _, encoded) in record.get('thumbnails', {}).items():
+            for name, nbytes in encoded.items():
+                counts[(name, size)] = counts.get((name, size), 0) + 1
+                totals[(name, size)] = totals.get((name, size), 0) + nbytes
+    
+    # Compact formats exist only at COMPACT_THUMBNAIL_SIZES
+    report = {name: {} for name, _, _ in thumbnail_formats}
+    for (name, size), count in sorted(counts.items(), key=lambda item: item[0][1]):
+        total = totals[(name, size)]
+        jpeg_total = totals.get(('jpeg', size), 0)
+        report[name][size] = {
+            'looks': count,
+            'total_bytes': total,
+            'average_bytes': total / count,
+            'vs_jpeg': total / jpeg_total if jpeg_total else None
+        }
+    return jsonify(report)
+
+@app.route('/search', methods=['POST'])
+def search():
+    """Auto-tag an uploaded photo and find the nearest runway looks.
+
+    Only the upload goes through FashionCLIP: its embedding is scored against
+    the cached label matrix and ranked against the resident catalog index.
+    """
+    upload = request.files.get('image')
+    if upload is None:
+        return jsonify({'error': 'upload a photo in the "image" field'}), 400
+    try:
+        k = int(request.args.get('k', SEARCH_RESULTS))
+    except ValueError:
+        k = 0
+    if not 1 <= k <= MAX_SEARCH_RESULTS:
+        return jsonify({'error': f'k must be a whole number from 1 to {MAX_SEARCH_RESULTS}'}), 400
+    
+    try:
+        image = load_model_image(upload.stream)
+    except Exception:
+        return jsonify({'error': 'could not read image'}), 400
+    
+    # Scored the same way as the catalog, so thresholds and embeddings are comparable
+    encoder = get_encoder()
+    if REGION_MODE:
+        similarities, embeddings = score_regions(image, labels, label_regions, PROMPT_TEMPLATES, encoder)
+    else:
+        similarities, embeddings = score_image(image, labels, PROMPT_TEMPLATES, encoder)
+    features = decode_features(similarities.numpy(), model_thresholds(encoder.model_id), label_features)
+    
+    with span('search'):
+        nearest = get_embedding_index(encoder.model_id).search(embeddings['full'], k=k)
+    
+    matches = []
+    for image_path, similarity in nearest:
+        record = catalog.get(image_path)
+        if record is None:
+            continue
+        look_id = get_look_id(image_path)
+        matches.append({
+            'id': look_id,
+            'designer': record.get('designer'),
+            'season': record.get('season'),
+            'year': record.get('year'),
+            'show': record.get('show'),
+            'features': record['features'],
+            'similarity': similarity,
+            'thumbnail': url_for('thumbnail', size=400, look_id=look_id) if 400 in record['thumbnails'] else None
+        })
+    
+    return jsonify({'features': features, 'matches': matches})
+
+@app.route('/encoder', methods=['GET', 'POST'])
+def encoder_endpoint():
+    """Active encoder backend; POST ?name=... switches it (admin only)"""
+    if request.method == 'POST':
+        if not is_admin(request.headers.get('X-Admin-Token', '')):
+            return jsonify({'error': 'forbidden'}), 403
+        try:
+            switch_encoder(request.args.get('name', ''))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    
+    encoder = get_encoder()
+    return jsonify({
+        'model_id': encoder.model_id,
+        'dim': encoder.dim,
+        'cached_models': sorted(image_features_cache)
+    })
+
+@app.route('/embeddings/snapshot', methods=['POST'])
+def embeddings_snapshot():
+    """Write the active model's catalog embeddings to disk for clustering (admin only)"""
+    if not is_admin(request.headers.get('X-Admin-Token', '')):
+        return jsonify({'error': 'forbidden'}), 403
+    
+    encoder = get_encoder()
+    embedding_index = get_embedding_index(encoder.model_id)
+    folder = os.path.join(EMBEDDINGS_FOLDER, embedding_index.model_id)
+    looks = {path: {key: record[key] for key in ('designer', 'season', 'year', 'show') if key in record}
+             for path, record in list(catalog.items())}
+    count = save_snapshot(folder, embedding_index, looks, labels,
+                          get_text_features(labels, PROMPT_TEMPLATES, encoder).numpy(), seasons, years)
+    return jsonify({'folder': folder, 'looks': count})
+
+@app.route('/ingest')
+def ingest_status():
+    """Progress of background ingestion jobs"""
+    return jsonify({
+        'queue_depth': ingest_queue.depth(),
+        'catalog_size': len(catalog),
+        'failed_images': len(ingest_queue.failed),
+        'jobs': ingest_queue.progress()
+    })
 
 if __name__ == '__main__':
+    # With the debug reloader only the child process serves requests
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_watcher(IMAGE_FOLDER, queue_new_images, interval=WATCH_INTERVAL)
     app.run(debug=True)
\ No newline at end of file
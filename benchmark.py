@@ -0,0 +1,166 @@
+"""Offline benchmark for the ingest, query and render hot paths.
+
+Builds a synthetic IMAGE_FOLDER tree, serves it with the deterministic stub
+encoder backend (or any other with --encoder) and reports ingest throughput, filtered query latency and peak
+RSS. Results can be saved as a JSON baseline and compared against later:
+
+    python benchmark.py --looks 500 --save baseline.json
+    python benchmark.py --looks 500 --compare baseline.json
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+def generate_tree(app, root, looks, size, seed):
+    """Write `looks` JPEGs spread over random designer/season/year/show folders"""
+    rng = random.Random(seed)
+    width, height = size
+    for i in range(looks):
+        dir_name = ' '.join([
+            rng.choice(app.designers),
+            rng.choice(app.seasons),
+            rng.choice(app.years),
+            rng.choice(app.shows)
+        ])
+        dir_path = os.path.join(root, dir_name)
+        os.makedirs(dir_path, exist_ok=True)
+        # Random low-frequency content keeps encoding cheap but realistic to decode
+        pixels = np.random.default_rng(seed + i).integers(0, 256, (height // 64, width // 64, 3), dtype=np.uint8)
+        image = Image.fromarray(pixels).resize((width, height), Image.BILINEAR)
+        image.save(os.path.join(dir_path, f'look{i:05d}.jpg'), quality=90)
+
+
+def random_query(app, rng):
+    """Query string with a random subset of filters"""
+    params = []
+    for key, options in [('designer', app.designers), ('season', app.seasons),
+                         ('year', app.years), ('show', app.shows)]:
+        if rng.random() < 0.5:
+            params += [(key, value) for value in rng.sample(options, rng.randint(1, 2))]
+    if rng.random() < 0.5:
+        params += [('feature', value) for value in rng.sample(app.all_features_flat, rng.randint(1, 2))]
+    return params
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q) * 1000) if values else 0.0
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='runway-bench-')
+    cwd = os.getcwd()
+    try:
+        # app.py creates its image folder relative to the working directory on import
+        os.chdir(workdir)
+        return measure(args, workdir)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def measure(args, workdir):
+    os.environ['ENCODER_BACKEND'] = args.encoder
+    import app
+
+    app.IMAGE_FOLDER = os.path.join(workdir, 'images')
+    app.REGION_MODE = args.region_mode
+    generate_tree(app, app.IMAGE_FOLDER, args.looks, (args.width, args.height), args.seed)
+    client = app.app.test_client()
+
+    # Ingest: time from the first page view until every look is published
+    start = time.perf_counter()
+    client.get('/')
+    while app.ingest_queue.depth():
+        time.sleep(0.01)
+    ingest_seconds = time.perf_counter() - start
+
+    scan_times = []
+    for _ in range(args.queries):
+        start = time.perf_counter()
+        app.scan_image_directory()
+        scan_times.append(time.perf_counter() - start)
+
+    rng = random.Random(args.seed)
+    query_times = []
+    for _ in range(args.queries):
+        query = random_query(app, rng)
+        start = time.perf_counter()
+        response = client.get('/', query_string=query)
+        query_times.append(time.perf_counter() - start)
+        assert response.status_code == 200
+
+    return {
+        'looks': args.looks,
+        'encoder': app.get_encoder().model_id,
+        'region_mode': args.region_mode,
+        'ingest_images_per_sec': args.looks / ingest_seconds,
+        'scan_p50_ms': percentile(scan_times, 50),
+        'scan_p99_ms': percentile(scan_times, 99),
+        'query_p50_ms': percentile(query_times, 50),
+        'query_p99_ms': percentile(query_times, 99),
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print the change against a baseline and return the regressed metrics"""
+    regressions = []
+    for key, value in results.items():
+        if key in ('looks', 'encoder', 'region_mode') or key not in baseline:
+            continue
+        base = baseline[key]
+        change = (value - base) / base if base else 0.0
+        # Throughput regresses when it drops, everything else when it grows
+        worse = -change if key.endswith('_per_sec') else change
+        flag = ' REGRESSION' if worse > tolerance else ''
+        print(f'{key:24} {base:12.2f} -> {value:12.2f} ({change:+.1%}){flag}')
+        if flag:
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--looks', type=int, default=200, help='number of synthetic looks')
+    parser.add_argument('--width', type=int, default=1200, help='synthetic image width')
+    parser.add_argument('--height', type=int, default=1800, help='synthetic image height')
+    parser.add_argument('--queries', type=int, default=100, help='number of timed queries')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--encoder', default='stub', help='encoder backend, see encoders.ENCODERS')
+    parser.add_argument('--region-mode', action='store_true', help='score upper/lower/full crops')
+    parser.add_argument('--save', metavar='PATH', help='write results as a JSON baseline')
+    parser.add_argument('--compare', metavar='PATH', help='compare against a JSON baseline')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative regression')
+    args = parser.parse_args()
+
+    results = run(args)
+    print(json.dumps(results, indent=2))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
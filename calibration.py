@@ -0,0 +1,46 @@
+import numpy as np
+
+
+def percentile_thresholds(scores, q=90):
+    """Per-label cutoff so each label fires on the top (100 - q)% of looks"""
+    return np.percentile(scores, q, axis=0).astype(np.float32)
+
+
+def zscore_thresholds(scores, z=1.5):
+    """Per-label cutoff `z` standard deviations above the label's catalog mean"""
+    return (scores.mean(axis=0) + z * scores.std(axis=0)).astype(np.float32)
+
+
+METHODS = {
+    'percentile': percentile_thresholds,
+    'zscore': zscore_thresholds
+}
+
+
+def calibrate(scores, method='percentile', **params):
+    """Threshold vector from a (looks, labels) score matrix"""
+    if method not in METHODS:
+        raise ValueError(f"Unknown calibration method {method!r}, expected one of {sorted(METHODS)}")
+    scores = np.asarray(scores, dtype=np.float32)
+    return METHODS[method](scores, **params)
+
+
+def feature_names(labels):
+    """Feature each label reports, dropping the component word of compound labels"""
+    names = []
+    for label in labels:
+        words = label.split()
+        names.append(' '.join(words[:-1]) if len(words) > 1 else label)
+    return names
+
+
+def decode_features(scores, thresholds, names):
+    """Features whose label scores exceed their thresholds.
+
+    `scores` is one look's score vector or a (looks, labels) matrix; the
+    cutoff is a single broadcast comparison either way.
+    """
+    mask = np.asarray(scores) > thresholds
+    if mask.ndim == 1:
+        return list(dict.fromkeys(names[i] for i in np.flatnonzero(mask)))
+    return [list(dict.fromkeys(names[i] for i in np.flatnonzero(row))) for row in mask]
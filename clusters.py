@@ -0,0 +1,217 @@
+"""Cluster catalog looks by image embedding to surface unnamed micro-trends.
+
+Reads an embedding snapshot written by the app (POST /embeddings/snapshot),
+memory-maps it and runs streaming mini-batch k-means over it chunk by
+chunk, so memory stays bounded however many looks the catalog holds:
+
+    python clusters.py embeddings/fashion-clip --k 24
+    python clusters.py embeddings/fashion-clip --k 12 --season "Fall Winter"
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+
+def period_list(seasons, years):
+    """Every (year, season) in chronological order; a look's period is its index here"""
+    return [(year, season) for year in years for season in seasons]
+
+
+def save_snapshot(folder, index, looks, label_names, label_matrix, seasons, years):
+    """Write embeddings, per-row periods and label embeddings for offline clustering.
+
+    `looks` maps image paths to their designer, season, year and show. Every
+    per-row file is a memory-mappable array or a line per row, so clustering
+    never loads per-look records; paths.txt is only for mapping rows back.
+    """
+    os.makedirs(folder, exist_ok=True)
+    paths = index.save(os.path.join(folder, 'embeddings.npy'))
+    period_index = {period: i for i, period in enumerate(period_list(seasons, years))}
+    periods = np.fromiter(
+        (period_index.get((looks.get(path, {}).get('year'), looks.get(path, {}).get('season')), -1) for path in paths),
+        dtype=np.int32, count=len(paths)
+    )
+    np.save(os.path.join(folder, 'periods.npy'), periods)
+    np.save(os.path.join(folder, 'labels.npy'), np.asarray(label_matrix, dtype=np.float32))
+    with open(os.path.join(folder, 'paths.txt'), 'w') as f:
+        f.writelines(path + '\n' for path in paths)
+    meta = {
+        'model_id': index.model_id,
+        'seasons': list(seasons),
+        'years': list(years),
+        'labels': list(label_names),
+        'looks': len(paths)
+    }
+    # The manifest goes last, so a snapshot is complete once it exists
+    with open(os.path.join(folder, 'snapshot.json.tmp'), 'w') as f:
+        json.dump(meta, f)
+    os.replace(os.path.join(folder, 'snapshot.json.tmp'), os.path.join(folder, 'snapshot.json'))
+    return len(paths)
+
+
+def load_snapshot(folder):
+    """(memory-mapped embeddings, memory-mapped periods, metadata, label embeddings) of a snapshot"""
+    embeddings = np.load(os.path.join(folder, 'embeddings.npy'), mmap_mode='r')
+    periods = np.load(os.path.join(folder, 'periods.npy'), mmap_mode='r')
+    label_matrix = np.load(os.path.join(folder, 'labels.npy'))
+    with open(os.path.join(folder, 'snapshot.json')) as f:
+        meta = json.load(f)
+    return embeddings, periods, meta, label_matrix
+
+
+def normalize(matrix):
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+
+def iter_chunks(embeddings, rows, chunk_rows):
+    """Normalized float32 chunks of the selected rows, read from disk one at a time"""
+    for start in range(0, len(rows), chunk_rows):
+        yield normalize(np.asarray(embeddings[rows[start:start + chunk_rows]], dtype=np.float32))
+
+
+class MiniBatchKMeans:
+    """Spherical mini-batch k-means (Sculley, 2010) on unit-length embeddings"""
+
+    def __init__(self, k, batch_size=1024, seed=0):
+        self.k = k
+        self.batch_size = batch_size
+        self.rng = np.random.default_rng(seed)
+        self.centers = None
+        self.counts = np.zeros(k, dtype=np.int64)
+
+    def init_centers(self, sample):
+        """k-means++ seeding on a sample of rows"""
+        centers = [sample[self.rng.integers(len(sample))]]
+        distance = 1 - sample @ centers[0]
+        for _ in range(1, self.k):
+            weights = np.maximum(distance, 0)
+            total = weights.sum()
+            i = self.rng.choice(len(sample), p=weights / total) if total > 0 else self.rng.integers(len(sample))
+            centers.append(sample[i])
+            distance = np.minimum(distance, 1 - sample @ sample[i])
+        self.centers = np.array(centers, dtype=np.float32)
+
+    def predict(self, batch):
+        return np.argmax(batch @ self.centers.T, axis=1)
+
+    def partial_fit(self, batch):
+        """Move each center towards its assigned points with a per-center decaying rate"""
+        assigned = self.predict(batch)
+        for center in np.unique(assigned):
+            points = batch[assigned == center]
+            self.counts[center] += len(points)
+            rate = len(points) / self.counts[center]
+            self.centers[center] += rate * (points.mean(axis=0) - self.centers[center])
+        self.centers = normalize(self.centers)
+        return self
+
+
+def fit(embeddings, rows, k, epochs=3, batch_size=1024, chunk_rows=65536, sample_rows=20000, seed=0):
+    """Cluster the selected rows and return (model, cluster of every row)"""
+    model = MiniBatchKMeans(k, batch_size=batch_size, seed=seed)
+    rng = np.random.default_rng(seed)
+
+    sample = np.sort(rng.choice(rows, size=min(sample_rows, len(rows)), replace=False))
+    model.init_centers(normalize(np.asarray(embeddings[sample], dtype=np.float32)))
+
+    for _ in range(epochs):
+        # Chunks are visited in random order and shuffled into mini-batches
+        chunks = np.array_split(rows, max(1, -(-len(rows) // chunk_rows)))
+        for i in rng.permutation(len(chunks)):
+            chunk = next(iter_chunks(embeddings, chunks[i], len(chunks[i])))
+            chunk = chunk[rng.permutation(len(chunk))]
+            for start in range(0, len(chunk), batch_size):
+                model.partial_fit(chunk[start:start + batch_size])
+
+    assignments = np.empty(len(rows), dtype=np.int32)
+    offset = 0
+    for chunk in iter_chunks(embeddings, rows, chunk_rows):
+        assignments[offset:offset + len(chunk)] = model.predict(chunk)
+        offset += len(chunk)
+    return model, assignments
+
+
+def report(model, assignments, look_periods, seasons, years, label_names, label_matrix, top_labels=3):
+    """Size, nearest labels and per-season growth of every cluster, fastest growing first.
+
+    `look_periods` holds the period_list index of every clustered row, -1 if unknown.
+    """
+    periods = period_list(seasons, years)
+    look_periods = np.asarray(look_periods)
+
+    # Looks per cluster per period, in chronological order
+    counts = np.zeros((model.k, len(periods)), dtype=np.int64)
+    valid = look_periods >= 0
+    np.add.at(counts, (assignments[valid], look_periods[valid]), 1)
+    totals = counts.sum(axis=0)
+    active = np.flatnonzero(totals)
+
+    label_scores = model.centers @ normalize(label_matrix).T
+    clusters = []
+    for cluster in range(model.k):
+        shares = counts[cluster] / np.maximum(totals, 1)
+        growth = None
+        if len(active) >= 2:
+            last, previous = active[-1], active[-2]
+            # Add-one smoothed share ratio between the two latest periods with looks
+            growth = float(((counts[cluster, last] + 1) / (totals[last] + model.k)) /
+                           ((counts[cluster, previous] + 1) / (totals[previous] + model.k)))
+        clusters.append({
+            'cluster': cluster,
+            'looks': int(counts[cluster].sum()),
+            'labels': [label_names[i] for i in np.argsort(-label_scores[cluster])[:top_labels]],
+            'growth': growth,
+            'series': [
+                {'year': periods[p][0], 'season': periods[p][1], 'looks': int(counts[cluster, p]), 'share': float(shares[p])}
+                for p in active
+            ]
+        })
+    clusters.sort(key=lambda c: -(c['growth'] or 0))
+    return clusters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('folder', help='snapshot folder, e.g. embeddings/fashion-clip')
+    parser.add_argument('--k', type=int, default=24, help='number of clusters')
+    parser.add_argument('--season', help='cluster only this season, across years')
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=1024)
+    parser.add_argument('--chunk-rows', type=int, default=65536, help='rows read from disk at a time')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='write the report as JSON here instead of printing it')
+    args = parser.parse_args()
+
+    embeddings, periods, meta, label_matrix = load_snapshot(args.folder)
+    if args.season:
+        if args.season not in meta['seasons']:
+            parser.error(f"Unknown season {args.season!r}, expected one of {meta['seasons']}")
+        # Periods run year by year through every season, so the season is the remainder
+        season = meta['seasons'].index(args.season)
+        rows = [np.zeros(0, dtype=np.int64)]
+        for start in range(0, len(periods), args.chunk_rows):
+            chunk = np.asarray(periods[start:start + args.chunk_rows])
+            rows.append(start + np.flatnonzero((chunk >= 0) & (chunk % len(meta['seasons']) == season)))
+        rows = np.concatenate(rows)
+    else:
+        rows = np.arange(len(periods), dtype=np.int64)
+    if len(rows) < args.k:
+        parser.error(f"{len(rows)} looks cannot form {args.k} clusters")
+
+    model, assignments = fit(embeddings, rows, args.k, args.epochs, args.batch_size, args.chunk_rows, seed=args.seed)
+    clusters = report(model, assignments, periods[rows], meta['seasons'], meta['years'],
+                      meta['labels'], label_matrix)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'model_id': meta['model_id'], 'season': args.season, 'clusters': clusters}, f, indent=2)
+    else:
+        for c in clusters:
+            growth = f"x{c['growth']:.2f}" if c['growth'] is not None else '-'
+            print(f"{c['cluster']:3d}  {c['looks']:7d} looks  growth {growth:>6}  {', '.join(c['labels'])}")
+
+
+if __name__ == '__main__':
+    main()
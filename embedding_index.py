@@ -0,0 +1,116 @@
+import os
+import threading
+import numpy as np
+
+
+class EmbeddingIndex:
+    """Image embeddings of catalog looks from one model, one matrix per crop region"""
+
+    def __init__(self, model_id=''):
+        self.model_id = model_id
+        self.lock = threading.Lock()
+        self.paths = {}  # region -> list of image paths, aligned with the rows
+        self.rows = {}  # region -> {image path: row}
+        self.matrices = {}  # region -> preallocated float32 array, grown by doubling
+        self.norms = {}  # region -> L2 norm of every row, for cosine search
+        self.live = {}  # region -> whether each row's look is still in the catalog
+
+    def add(self, image_path, embeddings):
+        """Store {region: vector} for a look, replacing earlier vectors"""
+        with self.lock:
+            for region, vector in embeddings.items():
+                vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+                rows = self.rows.setdefault(region, {})
+                paths = self.paths.setdefault(region, [])
+                matrix = self.matrices.get(region)
+                if matrix is None:
+                    matrix = self.matrices[region] = np.empty((64, vector.shape[0]), dtype=np.float32)
+                    self.norms[region] = np.empty(64, dtype=np.float32)
+                    self.live[region] = np.zeros(64, dtype=bool)
+
+                row = rows.get(image_path)
+                if row is None:
+                    row = len(paths)
+                    if row == matrix.shape[0]:
+                        matrix = np.concatenate([matrix, np.empty_like(matrix)])
+                        self.matrices[region] = matrix
+                        self.norms[region] = np.concatenate([self.norms[region], np.empty_like(self.norms[region])])
+                        self.live[region] = np.concatenate([self.live[region], np.zeros_like(self.live[region])])
+                    rows[image_path] = row
+                    paths.append(image_path)
+                matrix[row] = vector
+                self.norms[region][row] = np.linalg.norm(vector)
+                self.live[region][row] = True
+
+    def remove(self, image_path):
+        """Hide a look from search and snapshots; its rows are reused if it is added again"""
+        with self.lock:
+            for region, rows in self.rows.items():
+                row = rows.get(image_path)
+                if row is not None:
+                    self.live[region][row] = False
+
+    def get(self, image_path, region='full'):
+        with self.lock:
+            row = self.rows.get(region, {}).get(image_path)
+            if row is None or not self.live[region][row]:
+                return None
+            return self.matrices[region][row].copy()
+
+    def matrix(self, region='full'):
+        """(paths, embeddings) for every live look with a vector for `region`"""
+        with self.lock:
+            count = len(self.paths.get(region, []))
+            if not count:
+                return [], np.empty((0, 0), dtype=np.float32)
+            live = self.live[region][:count].copy()
+            paths = [path for path, keep in zip(self.paths[region], live) if keep]
+            matrix = self.matrices[region][:count]
+            # A view while nothing was removed, otherwise a copy of the live rows
+            return paths, matrix if live.all() else matrix[live]
+
+    def search(self, vector, k=10, region='full'):
+        """Top-k (path, cosine similarity) pairs for a query embedding"""
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        with self.lock:
+            count = len(self.paths.get(region, []))
+            if not count or k < 1:
+                return []
+            matrix = self.matrices[region][:count]
+            norms = self.norms[region][:count]
+            paths = self.paths[region][:count]
+            live = self.live[region][:count].copy()
+
+        # Rows are only appended, so the views stay valid outside the lock
+        scores = (matrix @ vector) / np.maximum(norms * np.linalg.norm(vector), 1e-12)
+        scores[~live] = -np.inf
+        k = min(k, int(live.sum()))
+        if k < 1:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(paths[i], float(scores[i])) for i in top]
+
+    def save(self, path, region='full', chunk_rows=65536):
+        """Write a region's live rows to a .npy file that can be memory-mapped, returning their paths"""
+        with self.lock:
+            count = len(self.paths.get(region, []))
+            matrix = self.matrices[region][:count] if count else np.empty((0, 0), dtype=np.float32)
+            live = self.live[region][:count].copy() if count else np.zeros(0, dtype=bool)
+            paths = [p for p, keep in zip(self.paths.get(region, []), live) if keep]
+
+        # Rows are only appended, so the view stays valid outside the lock
+        out = np.lib.format.open_memmap(path + '.tmp', mode='w+', dtype=np.float32, shape=(len(paths), matrix.shape[1]))
+        written = 0
+        for start in range(0, count, chunk_rows):
+            chunk = matrix[start:start + chunk_rows][live[start:start + chunk_rows]]
+            out[written:written + len(chunk)] = chunk
+            written += len(chunk)
+        out.flush()
+        del out
+        os.replace(path + '.tmp', path)
+        return paths
+
+    def __len__(self):
+        count = len(self.paths.get('full', []))
+        return int(self.live['full'][:count].sum()) if count else 0
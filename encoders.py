@@ -0,0 +1,85 @@
+import zlib
+import numpy as np
+
+
+class Encoder:
+    """Interface of the image/text embedding backends.
+
+    Embeddings are float32 arrays of shape (n, dim). model_id names the
+    weights and settings, and keys every cache and index built from them.
+    """
+
+    model_id = ''
+    dim = 0
+
+    def encode_text(self, texts, batch_size=32):
+        raise NotImplementedError
+
+    def encode_images(self, images, batch_size=32):
+        raise NotImplementedError
+
+
+class FashionCLIPEncoder(Encoder):
+    """FashionCLIP from the fashion-clip package"""
+
+    def __init__(self, model_name='fashion-clip'):
+        from fashion_clip.fashion_clip import FashionCLIP
+        self.fclip = FashionCLIP(model_name)
+        self.model_id = model_name
+        self.dim = self.fclip.model.config.projection_dim
+
+    def encode_text(self, texts, batch_size=32):
+        return np.asarray(self.fclip.encode_text(list(texts), batch_size=batch_size), dtype=np.float32)
+
+    def encode_images(self, images, batch_size=32):
+        return np.asarray(self.fclip.encode_images(list(images), batch_size=batch_size), dtype=np.float32)
+
+
+class QuantizedFashionCLIPEncoder(FashionCLIPEncoder):
+    """FashionCLIP with int8 dynamic quantization of its linear layers, for CPU serving"""
+
+    def __init__(self, model_name='fashion-clip'):
+        super().__init__(model_name)
+        import torch
+        self.fclip.device = 'cpu'
+        self.fclip.model = torch.quantization.quantize_dynamic(
+            self.fclip.model.to('cpu'), {torch.nn.Linear}, dtype=torch.qint8
+        )
+        self.model_id = f'{model_name}-int8'
+
+
+class StubEncoder(Encoder):
+    """Deterministic offline encoder hashing its inputs to Gaussian vectors.
+
+    Needs no model weights, so the serving stack can be run and benchmarked
+    anywhere. Equal inputs always give equal embeddings.
+    """
+
+    def __init__(self, dim=512):
+        self.dim = dim
+        self.model_id = f'stub-{dim}'
+
+    def _embed(self, key):
+        rng = np.random.default_rng(zlib.crc32(key))
+        return rng.standard_normal(self.dim).astype(np.float32)
+
+    def encode_text(self, texts, batch_size=32):
+        return np.stack([self._embed(text.encode()) for text in texts])
+
+    def encode_images(self, images, batch_size=32):
+        # Hashing an 8x8 reduction keeps this cheap and independent of input size
+        return np.stack([self._embed(image.convert('RGB').resize((8, 8)).tobytes()) for image in images])
+
+
+ENCODERS = {
+    'fashion-clip': FashionCLIPEncoder,
+    'fashion-clip-int8': QuantizedFashionCLIPEncoder,
+    'stub': StubEncoder
+}
+
+
+def load_encoder(name):
+    """Instantiate a backend by its ENCODERS name"""
+    if name not in ENCODERS:
+        raise ValueError(f"Unknown encoder {name!r}, expected one of {sorted(ENCODERS)}")
+    return ENCODERS[name]()
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+_lock = threading.Lock()
+
+SCHEMA_VERSION = 2  # Bumped when a table's columns change; a root holds one schema
+
+FORMATS = {
+    'parquet': '.parquet',
+    'arrow': '.arrow'  # Uncompressed Arrow IPC, memory-mappable with pyarrow
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Trend export needs pyarrow: pip install pyarrow")
+    return pyarrow
+
+
+def partition_dir(root, table, season, year):
+    """Hive-style partition folder, e.g. looks/season=Fall Winter/year=2024"""
+    return os.path.join(root, table, f"season={season}", f"year={year}")
+
+
+def load_manifest(root):
+    path = os.path.join(root, '_manifest.json')
+    if not os.path.exists(path):
+        return {'exported': [], 'labels': None, 'thresholds': None, 'format': None, 'schema': SCHEMA_VERSION, 'parts': 0}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(root, manifest):
+    # Written to a temporary file first so a crash never leaves a torn manifest
+    path = os.path.join(root, '_manifest.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(path + '.tmp', path)
+
+
+def thresholds_version(thresholds):
+    """Short digest of the label thresholds that decided every look's features"""
+    data = json.dumps([round(float(t), 6) for t in thresholds]).encode()
+    return hashlib.sha1(data).hexdigest()[:12]
+
+
+def write_table(table, path, fmt):
+    pa = _pyarrow()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if fmt == 'arrow':
+        pa.feather.write_feather(table, path, compression='uncompressed')
+    else:
+        pa.parquet.write_table(table, path)
+
+
+def look_table(looks, scores, labels):
+    """Per-look table: metadata, detected features and raw label scores"""
+    pa = _pyarrow()
+    score_type = pa.list_(pa.float32(), len(labels))
+    return pa.table({
+        'path': pa.array([look['path'] for look in looks], pa.string()),
+        'filename': pa.array([look['filename'] for look in looks], pa.string()),
+        'designer': pa.array([look['designer'] for look in looks], pa.string()),
+        'show': pa.array([look['show'] for look in looks], pa.string()),
+        'features': pa.array([look['features'] for look in looks], pa.list_(pa.string())),
+        'scores': pa.array([scores[look['path']].tolist() for look in looks], score_type)
+    }, metadata={'labels': json.dumps(labels)})
+
+
+def trend_table(looks):
+    """Feature counts per designer and show for a batch of looks.
+
+    Counts are additive, so summing rows across part files gives the
+    numerators for any slice of the full history; the matching look totals
+    are in total_table, since a pair with no hits writes no row here.
+    """
+    pa = _pyarrow()
+    counts = Counter(
+        (look['designer'], look['show'], feature)
+        for look in looks
+        for feature in look['features']
+    )
+    rows = sorted(counts.items())
+    return pa.table({
+        'designer': pa.array([key[0] for key, _ in rows], pa.string()),
+        'show': pa.array([key[1] for key, _ in rows], pa.string()),
+        'feature': pa.array([key[2] for key, _ in rows], pa.string()),
+        'looks_with_feature': pa.array([count for _, count in rows], pa.int64())
+    })
+
+
+def total_table(looks):
+    """Look counts per designer and show for a batch of looks, the denominators of trend_table"""
+    pa = _pyarrow()
+    rows = sorted(Counter((look['designer'], look['show']) for look in looks).items())
+    return pa.table({
+        'designer': pa.array([key[0] for key, _ in rows], pa.string()),
+        'show': pa.array([key[1] for key, _ in rows], pa.string()),
+        'total_looks': pa.array([count for _, count in rows], pa.int64())
+    })
+
+
+def export_catalog(looks, scores, labels, thresholds, root, fmt='parquet'):
+    """Append looks not exported before as new season/year partition files.
+
+    `looks` are processed catalog entries with path, filename, designer,
+    season, year, show and features decoded with `thresholds`; `scores` maps
+    their paths to raw label scores. Existing files are never rewritten, and
+    a root only ever holds one format, label list and threshold version.
+    Returns a summary.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}, expected one of {sorted(FORMATS)}")
+
+    with _lock:
+        os.makedirs(root, exist_ok=True)
+        manifest = load_manifest(root)
+        version = thresholds_version(thresholds)
+        if manifest['labels'] is not None and manifest['labels'] != list(labels):
+            raise ValueError("Labels changed since the last export; export to a new folder")
+        if manifest.get('thresholds') not in (None, version) and manifest['exported']:
+            raise ValueError("Thresholds changed since the last export; export to a new folder")
+        if manifest.get('format') not in (None, fmt) and manifest['exported']:
+            raise ValueError(f"{root} holds {manifest['format']} files; export {fmt} to a new folder")
+        if manifest.get('schema', 1) != SCHEMA_VERSION and manifest['exported']:
+            raise ValueError("Export columns changed since the last export; export to a new folder")
+
+        exported = set(manifest['exported'])
+        new_looks = [look for look in looks if look['path'] not in exported and look['path'] in scores]
+
+        partitions = {}
+        for look in new_looks:
+            partitions.setdefault((look['season'], look['year']), []).append(look)
+
+        files = []
+        part = manifest['parts']
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        for (season, year), batch in sorted(partitions.items()):
+            name = f"part-{stamp}-{part:05d}{FORMATS[fmt]}"
+            tables = [('looks', look_table(batch, scores, labels)), ('trends', trend_table(batch)), ('totals', total_table(batch))]
+            for table_name, table in tables:
+                path = os.path.join(partition_dir(root, table_name, season, year), name)
+                write_table(table, path, fmt)
+                files.append(path)
+            part += 1
+
+        manifest['exported'].extend(look['path'] for look in new_looks)
+        manifest['labels'] = list(labels)
+        manifest['thresholds'] = version
+        manifest['format'] = fmt
+        manifest['schema'] = SCHEMA_VERSION
+        manifest['parts'] = part
+        save_manifest(root, manifest)
+
+    return {
+        'new_looks': len(new_looks),
+        'partitions': len(partitions),
+        'files': files
+    }
@@ -0,0 +1,112 @@
+import threading
+import numpy as np
+
+# Set bits per byte value, for counting packed bitmaps
+POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.int64)
+
+
+class FacetIndex:
+    """Packed bitmaps of which looks carry each filter option, updated per look.
+
+    Options within a dimension combine with OR, except for dimensions listed
+    in `all_of` (features), where every selected option must be present.
+    `fields` maps dimensions to look keys where the names differ.
+    """
+
+    def __init__(self, dimensions, all_of=('feature',), fields={'feature': 'features'}, capacity=1024):
+        self.all_of = set(all_of)
+        self.fields = dict(fields)
+        self.dimensions = {dim: list(options) for dim, options in dimensions.items()}
+        self.rows = {}  # dim -> slice of its options' rows in self.bitmaps
+        self.option_rows = {}  # (dim, option) -> row
+        for dim, options in self.dimensions.items():
+            start = len(self.option_rows)
+            for i, option in enumerate(options):
+                self.option_rows[(dim, option)] = start + i
+            self.rows[dim] = slice(start, start + len(options))
+
+        self.lock = threading.Lock()
+        self.columns = {}  # look key -> bit column, kept if the look is removed
+        nbytes = max((capacity + 7) // 8, 1)
+        self.bitmaps = np.zeros((len(self.option_rows), nbytes), dtype=np.uint8)
+        self.all_looks = np.zeros(nbytes, dtype=np.uint8)  # Looks currently in the index
+
+    def _look_rows(self, look):
+        rows = []
+        for dim in self.dimensions:
+            value = look.get(self.fields.get(dim, dim))
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            rows.extend(self.option_rows[(dim, v)] for v in values if (dim, v) in self.option_rows)
+        return rows
+
+    def _column(self, key):
+        # Called with the lock held; bitmaps grow by doubling like the embedding index
+        column = self.columns.get(key)
+        if column is None:
+            column = self.columns[key] = len(self.columns)
+            if column // 8 == self.all_looks.shape[0]:
+                self.bitmaps = np.concatenate([self.bitmaps, np.zeros_like(self.bitmaps)], axis=1)
+                self.all_looks = np.concatenate([self.all_looks, np.zeros_like(self.all_looks)])
+        return column
+
+    def add(self, key, look):
+        """Index a look under `key`, replacing its earlier options"""
+        rows = self._look_rows(look)
+        with self.lock:
+            column = self._column(key)
+            byte, bit = column // 8, np.uint8(0x80 >> (column % 8))  # np.packbits bit order
+            self.bitmaps[:, byte] &= ~bit
+            self.bitmaps[rows, byte] |= bit
+            self.all_looks[byte] |= bit
+
+    def remove(self, key):
+        with self.lock:
+            column = self.columns.get(key)
+            if column is not None:
+                byte, bit = column // 8, np.uint8(0x80 >> (column % 8))
+                self.bitmaps[:, byte] &= ~bit
+                self.all_looks[byte] &= ~bit
+
+    def _dimension_mask(self, dim, selected, bitmaps, all_looks):
+        rows = [self.option_rows[(dim, v)] for v in selected if (dim, v) in self.option_rows]
+        if not selected:
+            return all_looks
+        if not rows:
+            return np.zeros_like(all_looks)
+        if dim in self.all_of:
+            return np.bitwise_and.reduce(bitmaps[rows], axis=0)
+        return np.bitwise_or.reduce(bitmaps[rows], axis=0)
+
+    def counts(self, selection):
+        """Matching looks per option if it were added to `selection`, plus the current total.
+
+        For OR dimensions an option's count ignores the dimension's own
+        selection; for all-of dimensions it narrows the full selection.
+        """
+        with self.lock:
+            nbytes = (len(self.columns) + 7) // 8
+            bitmaps = self.bitmaps[:, :nbytes].copy()
+            all_looks = self.all_looks[:nbytes].copy()
+
+        masks = {dim: self._dimension_mask(dim, selection.get(dim, []), bitmaps, all_looks) for dim in self.dimensions}
+        full = all_looks
+        for mask in masks.values():
+            full = full & mask
+
+        # Mask applied to every option row, chosen per dimension, then one AND and popcount
+        row_masks = np.empty_like(bitmaps)
+        for dim, rows in self.rows.items():
+            if dim in self.all_of:
+                row_masks[rows] = full
+            else:
+                others = all_looks
+                for other, mask in masks.items():
+                    if other != dim:
+                        others = others & mask
+                row_masks[rows] = others
+        totals = POPCOUNT[bitmaps & row_masks].sum(axis=1)
+
+        result = {'total': int(POPCOUNT[full].sum())}
+        for dim, options in self.dimensions.items():
+            result[dim] = dict(zip(options, totals[self.rows[dim]].tolist()))
+        return result
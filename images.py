@@ -0,0 +1,78 @@
+from PIL import Image
+
+MODEL_SIZE = 224  # Shortest side FashionCLIP resizes its input to
+THUMBNAIL_SIZES = (200, 400, 800)  # Bounding boxes of the card thumbnails offered in srcset
+THUMBNAIL_SIZE = max(THUMBNAIL_SIZES)  # Largest box, which every smaller thumbnail is resized from
+
+
+def model_input_size(width, height, size=MODEL_SIZE):
+    """Size at which the shortest side equals `size`"""
+    scale = size / min(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def thumbnail_size(width, height, size=THUMBNAIL_SIZE):
+    """Size at which the image fits inside a `size` x `size` box"""
+    scale = min(size / width, size / height, 1)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def decode(img, target):
+    """Decode an opened image at the smallest resolution still covering `target`.
+
+    JPEGs use draft mode, so libjpeg scales by 1/2, 1/4 or 1/8 during the
+    decode and never materialises the full-resolution bitmap. Other formats
+    are decoded fully and then shrunk with a cheap integer reduce.
+    """
+    img.draft('RGB', target)
+    factor = min(img.width // target[0], img.height // target[1])
+    img = img.convert('RGB')
+    if factor >= 2:
+        img = img.reduce(factor)
+    return img
+
+
+def fit_model_input(img):
+    """Resize a decoded image so its shortest side is MODEL_SIZE"""
+    if min(img.size) > MODEL_SIZE:
+        img = img.resize(model_input_size(*img.size), Image.BICUBIC)
+    return img
+
+
+def load_model_image(image_path):
+    """Decode an image for FashionCLIP"""
+    with Image.open(image_path) as img:
+        img = decode(img, model_input_size(*img.size))
+    return fit_model_input(img)
+
+
+def load_thumbnail(image_path):
+    """Decode an image for a card thumbnail"""
+    with Image.open(image_path) as img:
+        img = decode(img, thumbnail_size(*img.size))
+    img.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    return img
+
+
+def load_look(image_path):
+    """Decode an image once and return (model input, thumbnail)"""
+    with Image.open(image_path) as img:
+        model_target = model_input_size(*img.size)
+        thumb_target = thumbnail_size(*img.size)
+        target = (max(model_target[0], thumb_target[0]), max(model_target[1], thumb_target[1]))
+        img = decode(img, target)
+
+    thumbnail = img.copy()
+    thumbnail.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+    return fit_model_input(img), thumbnail
+
+
+def thumbnail_variants(img, sizes=THUMBNAIL_SIZES):
+    """{size: image fitting a size x size box} from a decoded thumbnail, never upscaled"""
+    variants = {}
+    for size in sorted(sizes, reverse=True):
+        # Each size is resized from the next larger one, which is cheaper than from the source
+        img = img.copy()
+        img.thumbnail((size, size))
+        variants[size] = img
+    return variants
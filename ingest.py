@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+class IngestQueue:
+    """Background queue that processes new looks with bounded concurrency.
+
+    Images that fail are not queued again until their file changes or
+    `retry_after` seconds pass, and only the latest `keep_jobs` finished
+    jobs are kept for progress reports.
+    """
+
+    def __init__(self, process, publish, max_workers=2, retry_after=600.0, keep_jobs=100):
+        self.process = process
+        self.publish = publish
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ingest')
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.failed = {}  # image path -> (mtime when it failed, time of the failure)
+        self.retry_after = retry_after
+        self.keep_jobs = keep_jobs
+        self.jobs = {}
+        self.job_ids = itertools.count(1)
+
+    def submit(self, image_paths, name=''):
+        """Queue images that are not already pending, grouped as one job"""
+        with self.lock:
+            image_paths = [p for p in image_paths if p not in self.pending and not self._failed_recently(p)]
+            if not image_paths:
+                return None
+            self.pending.update(image_paths)
+            job_id = next(self.job_ids)
+            self.jobs[job_id] = {
+                'id': job_id,
+                'name': name,
+                'total': len(image_paths),
+                'done': 0,
+                'failed': 0,
+                'state': 'queued',
+                'started': time.time(),
+                'finished': None
+            }
+
+        for image_path in image_paths:
+            self.executor.submit(self._run, job_id, image_path)
+        return job_id
+
+    def _run(self, job_id, image_path):
+        with self.lock:
+            if self.jobs[job_id]['state'] == 'queued':
+                self.jobs[job_id]['state'] = 'running'
+
+        mtime = _mtime(image_path)
+        result = None
+        try:
+            result = self.process(image_path)
+        except Exception as e:
+            print(f"Error ingesting {image_path}: {e}")
+
+        with self.lock:
+            job = self.jobs[job_id]
+            if result is None:
+                self.failed[image_path] = (mtime, time.time())
+                job['failed'] += 1
+            else:
+                # Publish under the lock so the look leaves "pending" and
+                # appears in the catalog in a single step
+                self.failed.pop(image_path, None)
+                self.publish(image_path, result)
+                job['done'] += 1
+            self.pending.discard(image_path)
+            if job['done'] + job['failed'] == job['total']:
+                job['state'] = 'finished'
+                job['finished'] = time.time()
+                self._prune_jobs()
+
+    def _failed_recently(self, image_path):
+        # Called with the lock held
+        failure = self.failed.get(image_path)
+        if failure is None:
+            return False
+        mtime, failed_at = failure
+        if mtime == _mtime(image_path) and time.time() - failed_at < self.retry_after:
+            return True
+        del self.failed[image_path]
+        return False
+
+    def _prune_jobs(self):
+        # Called with the lock held; running jobs are always kept
+        finished = sorted(job_id for job_id, job in self.jobs.items() if job['state'] == 'finished')
+        for job_id in finished[:max(len(finished) - self.keep_jobs, 0)]:
+            del self.jobs[job_id]
+
+    def has_failed(self, image_path):
+        """Whether an image failed and is not due for another attempt yet"""
+        if image_path not in self.failed:
+            return False
+        with self.lock:
+            return self._failed_recently(image_path)
+
+    def forget_failures(self):
+        """Let every failed image be queued again, e.g. after switching models"""
+        with self.lock:
+            self.failed.clear()
+
+    def is_pending(self, image_path):
+        return image_path in self.pending
+
+    def depth(self):
+        """Number of images waiting for or in processing"""
+        return len(self.pending)
+
+    def progress(self):
+        """Snapshot of all jobs, most recent first"""
+        with self.lock:
+            return [dict(job) for job in sorted(self.jobs.values(), key=lambda j: -j['id'])]
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def list_images(dir_path):
+    """List image files in a show folder"""
+    try:
+        filenames = os.listdir(dir_path)
+    except OSError:
+        return []
+    return [os.path.join(dir_path, f) for f in sorted(filenames) if f.lower().endswith(IMAGE_EXTENSIONS)]
+
+
+def watch_directory(root, on_new_images, interval=2.0, stop_event=None):
+    """Poll a directory tree and report images that appeared since the last pass.
+
+    Each show folder is reported separately so a newly copied show becomes
+    one ingestion job. Runs until stop_event is set.
+    """
+    seen = set()
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        try:
+            dir_names = sorted(os.listdir(root))
+        except OSError:
+            dir_names = []
+        for dir_name in dir_names:
+            dir_path = os.path.join(root, dir_name)
+            if not os.path.isdir(dir_path):
+                continue
+            new_images = [p for p in list_images(dir_path) if p not in seen]
+            if new_images:
+                seen.update(new_images)
+                on_new_images(dir_name, new_images)
+        stop_event.wait(interval)
+
+
+def start_watcher(root, on_new_images, interval=2.0):
+    """Run watch_directory on a daemon thread"""
+    stop_event = threading.Event()
+    thread = threading.Thread(
+        target=watch_directory,
+        args=(root, on_new_images, interval, stop_event),
+        name='ingest-watcher',
+        daemon=True
+    )
+    thread.start()
+    return stop_event
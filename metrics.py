@@ -0,0 +1,141 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Upper bounds in seconds of the stage latency histogram buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_stages = {}  # stage -> [per-bucket counts..., count, sum]
+_counters = {}  # (name, labels) -> value
+_gauges = {}  # name -> (help, callback returning {labels: value})
+_local = threading.local()
+
+
+def observe(stage, seconds):
+    """Record one timing of a stage"""
+    with _lock:
+        stats = _stages.setdefault(stage, [0] * len(BUCKETS) + [0, 0.0])
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                stats[i] += 1
+        stats[-2] += 1
+        stats[-1] += seconds
+
+    spans = getattr(_local, 'spans', None)
+    if spans is not None:
+        spans.append((stage, seconds))
+
+
+@contextmanager
+def span(stage):
+    """Time the enclosed block as `stage`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def timed(stage):
+    """Decorator timing every call of a function as `stage`"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def inc(name, labels=(), value=1):
+    """Increment a counter; labels is a tuple of (key, value) pairs"""
+    with _lock:
+        key = (name, tuple(labels))
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def cache_lookup(cache, hit):
+    """Count a hit or miss against a named cache"""
+    inc('runway_cache_requests_total', (('cache', cache), ('result', 'hit' if hit else 'miss')))
+
+
+def register_gauge(name, callback, help=''):
+    """Expose a value read at scrape time; callback returns a number or {labels: number}"""
+    _gauges[name] = (help, callback)
+
+
+def begin_request():
+    """Start collecting spans observed on this thread"""
+    _local.spans = []
+
+
+def end_request():
+    """Stop collecting and return this thread's spans"""
+    spans = getattr(_local, 'spans', None) or []
+    _local.spans = None
+    return spans
+
+
+def server_timing(spans):
+    """Format spans as a Server-Timing header, summing repeated stages"""
+    totals = {}
+    for stage, seconds in spans:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    return ', '.join(f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in totals.items())
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        stages = {stage: list(stats) for stage, stats in _stages.items()}
+        counters = dict(_counters)
+
+    lines.append('# HELP runway_stage_seconds Time spent per hot-path stage')
+    lines.append('# TYPE runway_stage_seconds histogram')
+    for stage, stats in sorted(stages.items()):
+        for bound, count in zip(BUCKETS, stats):
+            lines.append(f'runway_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+        lines.append(f'runway_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {stats[-2]}')
+        lines.append(f'runway_stage_seconds_count{{stage="{stage}"}} {stats[-2]}')
+        lines.append(f'runway_stage_seconds_sum{{stage="{stage}"}} {stats[-1]:.6f}')
+
+    names = sorted({name for name, _ in counters})
+    for name in names:
+        lines.append(f'# TYPE {name} counter')
+        for (counter, labels), value in sorted(counters.items()):
+            if counter == name:
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+
+    # Hit ratio per cache, derived from the lookup counter
+    lookups = {}
+    for (counter, labels), value in counters.items():
+        if counter == 'runway_cache_requests_total':
+            labels = dict(labels)
+            hits, total = lookups.get(labels['cache'], (0, 0))
+            lookups[labels['cache']] = (hits + (value if labels['result'] == 'hit' else 0), total + value)
+    if lookups:
+        lines.append('# TYPE runway_cache_hit_ratio gauge')
+        for cache, (hits, total) in sorted(lookups.items()):
+            lines.append(f'runway_cache_hit_ratio{{cache="{cache}"}} {hits / total:.4f}')
+
+    for name, (help, callback) in sorted(_gauges.items()):
+        if help:
+            lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} gauge')
+        value = callback()
+        if isinstance(value, dict):
+            for labels, v in sorted(value.items()):
+                lines.append(f'{name}{_format_labels(labels)} {v}')
+        else:
+            lines.append(f'{name} {value}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,93 @@
+import cProfile
+import os
+import sys
+import threading
+import time
+
+
+def frame_name(frame):
+    code = frame.f_code
+    # Semicolons separate frames in the collapsed stack format
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})".replace(';', ':')
+
+
+class StackSampler:
+    """Periodically sample the stacks of selected threads.
+
+    Samples the thread that started it plus every thread whose name starts
+    with one of `thread_prefixes`, so work handed to background workers
+    (such as FashionCLIP inference on the ingestion pool) shows up too.
+    """
+
+    def __init__(self, interval=0.005, thread_prefixes=('ingest',)):
+        self.interval = interval
+        self.thread_prefixes = thread_prefixes
+        self.target_id = threading.get_ident()
+        self.stacks = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def _thread_names(self):
+        names = {}
+        for thread in threading.enumerate():
+            if thread.ident == self.target_id or thread.name.startswith(self.thread_prefixes):
+                names[thread.ident] = thread.name
+        return names
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            names = self._thread_names()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id not in names:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names[thread_id])
+                key = ';'.join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.stacks
+
+
+def write_folded(stacks, path):
+    """Write stacks in the collapsed format read by flamegraph.pl and speedscope"""
+    with open(path, 'w') as f:
+        for stack, count in sorted(stacks.items()):
+            f.write(f'{stack} {count}\n')
+
+
+class RequestProfile:
+    """Profile of one request, either stack sampled or with cProfile"""
+
+    def __init__(self, mode='sample', interval=0.005):
+        self.mode = mode
+        if mode == 'cprofile':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.profiler = StackSampler(interval=interval).start()
+
+    def finish(self, output_dir, name):
+        """Stop profiling and write the trace, returning its path"""
+        os.makedirs(output_dir, exist_ok=True)
+        base = os.path.join(output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}")
+        if self.mode == 'cprofile':
+            self.profiler.disable()
+            # pstats dumps load in snakeviz, or flameprof for a flamegraph
+            path = base + '.prof'
+            self.profiler.dump_stats(path)
+        else:
+            path = base + '.folded'
+            write_folded(self.profiler.stop(), path)
+        return path
@@ -1,21 +1,125 @@
-from fashion_clip.fashion_clip import FashionCLIP
-from PIL import Image
+from encoders import load_encoder
+from images import load_model_image
+from metrics import timed
 import torch
 
-fclip = FashionCLIP('fashion-clip')
+# Active embedding backend, chosen with use_encoder
+encoder = None
 
-def get_similarities(image_path, labels):
+def use_encoder(name):
+    """Load and switch to an encoder backend, e.g. 'fashion-clip' or 'stub'"""
+    return set_encoder(load_encoder(name))
 
-    image = Image.open(image_path)
+def set_encoder(new_encoder):
+    """Switch to an already loaded encoder"""
+    global encoder
+    encoder = new_encoder
+    return encoder
 
-    
-    text_features = fclip.encode_text(labels, batch_size=1)
-    image_features = fclip.encode_images([image], batch_size=1)
+def get_encoder():
+    if encoder is None:
+        use_encoder('fashion-clip')
+    return encoder
 
-    image_features = torch.tensor(fclip.encode_images([image], batch_size=1)).to(torch.float32)
-    text_features = torch.tensor(fclip.encode_text(labels, batch_size=1)).to(torch.float32)
+# Crop boxes as (left, top, right, bottom) fractions of a full-length runway photo
+REGIONS = {
+    'upper': (0.0, 0.1, 1.0, 0.55),
+    'lower': (0.0, 0.4, 1.0, 0.95),
+    'full': (0.0, 0.0, 1.0, 1.0)
+}
 
+# Prompt templates for ensembling, e.g. PROMPT_TEMPLATES = RUNWAY_TEMPLATES in app.py
+RUNWAY_TEMPLATES = [
+    '{label}',
+    'a runway photo of a {label}',
+    'a model wearing a {label}',
+    'a fashion show look with a {label}',
+    'a close-up photo of a {label}'
+]
+
+# Label text embeddings, encoded once per model, label list and template set
+text_features_cache = {}
+
+def encode_prompt_ensemble(labels, templates, encoder=None):
+    """Average the normalized embeddings of every template filled with each label.
+
+    The mean is normalized and then rescaled to the average raw norm of its
+    prompts, so scores stay on the scale of single-prompt labels and the
+    fixed feature threshold keeps its meaning.
+    """
+    prompts = [template.format(label=label) for label in labels for template in templates]
+    features = torch.from_numpy((encoder or get_encoder()).encode_text(prompts))
+    features = features.reshape(len(labels), len(templates), -1)
+
+    norms = features.norm(dim=-1, keepdim=True)
+    mean = (features / norms).mean(dim=1)
+    mean = mean / mean.norm(dim=-1, keepdim=True)
+    return mean * norms.mean(dim=1)
+
+def get_text_features(labels, templates=None, encoder=None):
+    """Text embeddings of labels as a float32 matrix, encoded once and cached.
+
+    Functions here take an optional encoder so a caller can pin one model
+    for a whole look; they default to the active one.
+    """
+    encoder = encoder or get_encoder()
+    key = (encoder.model_id, tuple(labels), tuple(templates or ()))
+    if key not in text_features_cache:
+        if templates:
+            text_features_cache[key] = encode_prompt_ensemble(labels, templates, encoder)
+        else:
+            text_features_cache[key] = torch.from_numpy(encoder.encode_text(labels))
+    return text_features_cache[key]
+
+def encode_images(images, encoder=None):
+    """Image embeddings of a batch of PIL images in one forward pass"""
+    return torch.from_numpy((encoder or get_encoder()).encode_images(images, batch_size=len(images)))
+
+def crop_regions(image):
+    """Crop an image into the REGIONS boxes, in REGIONS order"""
+    width, height = image.size
+    return [
+        image.crop((round(l * width), round(t * height), round(r * width), round(b * height)))
+        for l, t, r, b in REGIONS.values()
+    ]
+
+@timed('get_similarities')
+def score_image(image, labels, templates=None, encoder=None):
+    """Score a whole image against labels, returning (similarities, {'full': embedding})"""
+
+    if isinstance(image, str):
+        image = load_model_image(image)
+
+    image_features = encode_images([image], encoder)
+    text_features = get_text_features(labels, templates, encoder)
 
     similarities = (image_features @ text_features.T)[0]
 
-    return similarities
\ No newline at end of file
+    return similarities, {'full': image_features[0].numpy()}
+
+@timed('get_similarities')
+def score_regions(image, labels, label_regions, templates=None, encoder=None):
+    """Score upper, lower and full crops in one batch and keep each label's region score.
+
+    label_regions names the region of every label, e.g. 'lower' for "floral
+    print skirt". Returns (similarities, {region: embedding}).
+    """
+
+    if isinstance(image, str):
+        image = load_model_image(image)
+
+    image_features = encode_images(crop_regions(image), encoder)
+    text_features = get_text_features(labels, templates, encoder)
+
+    # (regions, labels) scores, then pick each label's own region
+    scores = image_features @ text_features.T
+    region_names = list(REGIONS)
+    rows = torch.tensor([region_names.index(region) for region in label_regions])
+    similarities = scores[rows, torch.arange(len(labels))]
+
+    embeddings = {region: image_features[i].numpy() for i, region in enumerate(region_names)}
+    return similarities, embeddings
+
+def get_similarities(image, labels, templates=None):
+    """Score an image path or an already decoded PIL image against labels"""
+    return score_image(image, labels, templates)[0]
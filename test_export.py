@@ -0,0 +1,58 @@
+import glob
+import os
+
+import numpy as np
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+import pyarrow.parquet
+
+from export import export_catalog
+
+LABELS = ['fur coat', 'lace dress']
+
+
+def make_looks(prefix, count, with_fur):
+    return [{
+        'path': f'{prefix}/look{i}.jpg',
+        'filename': f'look{i}.jpg',
+        'designer': 'Dior',
+        'season': 'Fall Winter',
+        'year': '2024',
+        'show': 'Paris',
+        'features': ['fur'] if i < with_fur else []
+    } for i in range(count)]
+
+
+def read_table(root, name):
+    files = glob.glob(os.path.join(root, name, '*', '*', '*.parquet'))
+    return pa.concat_tables([pa.parquet.read_table(f) for f in sorted(files)])
+
+
+def test_totals_count_looks_without_features(tmp_path):
+    root = str(tmp_path)
+    thresholds = np.full(len(LABELS), 20.0)
+    part_a = make_looks('a', 10, with_fur=3)
+    part_b = make_looks('b', 5, with_fur=0)
+    scores = {look['path']: np.zeros(len(LABELS), dtype=np.float32) for look in part_a + part_b}
+
+    export_catalog(part_a, scores, LABELS, thresholds, root)
+    export_catalog(part_a + part_b, scores, LABELS, thresholds, root)
+
+    trends = read_table(root, 'trends').to_pylist()
+    totals = read_table(root, 'totals').to_pylist()
+    fur = sum(row['looks_with_feature'] for row in trends if row['feature'] == 'fur')
+    looks = sum(row['total_looks'] for row in totals)
+    assert (fur, looks) == (3, 15)
+
+
+def test_refuses_other_thresholds_and_formats(tmp_path):
+    root = str(tmp_path)
+    looks = make_looks('a', 2, with_fur=1)
+    scores = {look['path']: np.zeros(len(LABELS), dtype=np.float32) for look in looks}
+    export_catalog(looks, scores, LABELS, np.full(len(LABELS), 20.0), root)
+
+    with pytest.raises(ValueError, match='Thresholds changed'):
+        export_catalog(looks, scores, LABELS, np.full(len(LABELS), 25.0), root)
+    with pytest.raises(ValueError, match='holds parquet files'):
+        export_catalog(looks, scores, LABELS, np.full(len(LABELS), 20.0), root, 'arrow')
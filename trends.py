@@ -0,0 +1,91 @@
+import threading
+import numpy as np
+
+DIMENSIONS = ('designer', 'season', 'year', 'show')
+
+
+class TrendCounts:
+    """Look counts per feature x designer x season x year x show, updated per look"""
+
+    def __init__(self, features, designers, seasons, years, shows):
+        self.features = list(features)
+        self.options = dict(zip(DIMENSIONS, (list(designers), list(seasons), list(years), list(shows))))
+        self.feature_index = {feature: i for i, feature in enumerate(self.features)}
+        self.option_index = {dim: {value: i for i, value in enumerate(values)} for dim, values in self.options.items()}
+        shape = tuple(len(values) for values in self.options.values())
+        self.counts = np.zeros((len(self.features),) + shape, dtype=np.int64)
+        self.totals = np.zeros(shape, dtype=np.int64)
+        self.lock = threading.Lock()
+
+    def _cell(self, look):
+        return tuple(self.option_index[dim][look[dim]] for dim in DIMENSIONS)
+
+    def _update(self, look, features, delta):
+        cell = self._cell(look)
+        rows = [self.feature_index[f] for f in set(features) if f in self.feature_index]
+        with self.lock:
+            self.totals[cell] += delta
+            for row in rows:
+                self.counts[(row,) + cell] += delta
+
+    def add(self, look, features):
+        """Count a look with its features; look holds designer, season, year and show"""
+        self._update(look, features, 1)
+
+    def remove(self, look, features):
+        self._update(look, features, -1)
+
+    def _masks(self, selection):
+        # Empty or missing selections keep every option of that dimension
+        masks = []
+        for dim in DIMENSIONS:
+            values = selection.get(dim) or self.options[dim]
+            mask = np.zeros(len(self.options[dim]), dtype=bool)
+            mask[[self.option_index[dim][v] for v in values if v in self.option_index[dim]]] = True
+            masks.append(mask)
+        return masks
+
+    def slice_counts(self, selection):
+        """(per-feature look counts, total looks) for a {dimension: [values]} slice"""
+        masks = self._masks(selection)
+        with self.lock:
+            totals = self.totals[np.ix_(*masks)].sum()
+            counts = self.counts[np.ix_(np.ones(len(self.features), dtype=bool), *masks)].sum(axis=(1, 2, 3, 4))
+        return counts, int(totals)
+
+    def compare(self, base, target, limit=10):
+        """Rank features by how their share changed from the base slice to the target.
+
+        Lift is the ratio of add-one smoothed shares and the score is a
+        two-proportion z statistic, positive when a feature is rising.
+        """
+        base_counts, base_total = self.slice_counts(base)
+        target_counts, target_total = self.slice_counts(target)
+        if not base_total or not target_total:
+            return {'base_looks': base_total, 'target_looks': target_total, 'rising': [], 'fading': []}
+
+        base_share = base_counts / base_total
+        target_share = target_counts / target_total
+        lift = ((target_counts + 1) / (target_total + 2)) / ((base_counts + 1) / (base_total + 2))
+
+        pooled = (base_counts + target_counts) / (base_total + target_total)
+        se = np.sqrt(pooled * (1 - pooled) * (1 / base_total + 1 / target_total))
+        z = np.divide(target_share - base_share, se, out=np.zeros_like(se), where=se > 0)
+
+        def ranked(order):
+            return [{
+                'feature': self.features[i],
+                'base_share': float(base_share[i]),
+                'target_share': float(target_share[i]),
+                'lift': float(lift[i]),
+                'z': float(z[i])
+            } for i in order]
+
+        order = np.argsort(-z)
+        limit = max(limit, 0)
+        return {
+            'base_looks': base_total,
+            'target_looks': target_total,
+            'rising': ranked([i for i in order[:limit] if z[i] > 0]),
+            'fading': ranked([i for i in order[::-1][:limit] if z[i] < 0])
+        }